@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import subprocess
+import multiprocessing
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic_data import generate_dataset
+from metrics.compute_quality_metrics import load_paths, process_videos
+from metrics.upload_files import (
+    load_track_counts,
+    load_gt,
+    preprocess_submission,
+    build_file_timestamp_dict,
+    build_timestamp_index,
+    match_timestamps,
+    build_all_data
+)
+from metrics.overall_metrics import evaluate_models
+from metrics.track_store import load_tracks
+from metrics.kinematics import video_kinematics
+
+# Each stage is timed in a fresh process so its peak RSS is its own; results
+# are appended as one JSON line per (scale, stage, repeat)
+
+SCALES = {
+    'small': {'videos': 30, 'width': 64, 'height': 64, 'frames': 16, 'cells': 4, 'teams': 4, 'submissions': 5},
+    'medium': {'videos': 200, 'width': 128, 'height': 128, 'frames': 32, 'cells': 6, 'teams': 8, 'submissions': 20},
+    'large': {'videos': 1000, 'width': 256, 'height': 256, 'frames': 64, 'cells': 8, 'teams': 12, 'submissions': 50}
+}
+
+#---------------------------------------------------------------
+
+def bench_quality_metrics(paths, opts):
+    video_dict, track_dict, common_keys = load_paths(paths['datasets'], paths['tracks'])
+    output_csv = os.path.join(opts['work_dir'], 'quality_overall.csv')
+    return lambda: process_videos(video_dict, track_dict, common_keys, output_csv, workers=opts['workers'])
+
+def bench_track_counts(paths, opts):
+    return lambda: load_track_counts(paths['tracks'])
+
+def bench_kinematics(paths, opts):
+    return lambda: video_kinematics(load_tracks(paths['tracks']))
+
+def bench_preprocess_submission(paths, opts):
+    return lambda: preprocess_submission(paths['submission2'])
+
+def bench_timestamp_matching(paths, opts):
+    submission_df = preprocess_submission(paths['submission2'])
+    def run():
+        timestamp_index = build_timestamp_index(build_file_timestamp_dict(paths['timestamp_pattern']))
+        match_timestamps(submission_df['timestamp'].to_numpy(), timestamp_index)
+    return run
+
+def bench_build_all_data(paths, opts):
+    gt = load_gt(paths['gt2'])
+    submission_df = preprocess_submission(paths['submission2'])
+    file_timestamp_dict = build_file_timestamp_dict(paths['timestamp_pattern'])
+    return lambda: build_all_data(submission_df, file_timestamp_dict, gt)
+
+def bench_evaluate_models(paths, opts):
+    gt = load_gt(paths['gt2'])
+    submission_df = preprocess_submission(paths['submission2'])
+    all_data = build_all_data(submission_df, build_file_timestamp_dict(paths['timestamp_pattern']), gt)
+    return lambda: evaluate_models(all_data)
+
+STAGES = {
+    'quality_metrics': bench_quality_metrics,
+    'track_counts': bench_track_counts,
+    'kinematics': bench_kinematics,
+    'preprocess_submission': bench_preprocess_submission,
+    'timestamp_matching': bench_timestamp_matching,
+    'build_all_data': bench_build_all_data,
+    'evaluate_models': bench_evaluate_models
+}
+
+#---------------------------------------------------------------
+
+def current_rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+#---------------------------------------------------------------
+
+def measure_stage(stage, paths, opts):
+    # Runs in its own process; setup is not timed, only the returned callable.
+    # Stdout of the stage is silenced so the report stays readable.
+    run = STAGES[stage](paths, opts)
+    rss_before = current_rss_mb()
+    children_before = os.times()
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            wall, cpu = time.perf_counter(), time.process_time()
+            run()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        finally:
+            sys.stdout = stdout
+    children = os.times()
+    cpu_children = (children.children_user - children_before.children_user
+                    + children.children_system - children_before.children_system)
+    return {
+        'wall_s': wall,
+        'cpu_s': cpu + cpu_children,
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_rss_children_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+#---------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#---------------------------------------------------------------
+
+def run_benchmarks(scales, stages, data_dir, output, repeats=3, workers=1, label=None):
+    context = multiprocessing.get_context('spawn')
+    info = {
+        'label': label,
+        'commit': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'workers': workers
+    }
+    records = []
+    for scale in scales:
+        paths = generate_dataset(os.path.join(data_dir, scale), **SCALES[scale])
+        opts = {'work_dir': os.path.join(data_dir, scale), 'workers': workers}
+        for stage in stages:
+            for repeat in range(repeats):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(measure_stage, stage, paths, opts).result()
+                record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), **info, 'scale': scale,
+                          'params': SCALES[scale], 'stage': stage, 'repeat': repeat, **result}
+                records.append(record)
+                with open(output, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+                print(f"{scale:8s} {stage:22s} #{repeat}: {result['wall_s']:8.3f} s wall, "
+                      f"{result['cpu_s']:8.3f} s CPU, {result['peak_rss_mb']:8.1f} MB peak RSS")
+    return pd.DataFrame(records)
+
+#---------------------------------------------------------------
+
+def summarize(results, baseline=None):
+    summary = results.groupby(['scale', 'stage'], sort=False)[['wall_s', 'cpu_s', 'peak_rss_mb']].median()
+    if baseline is not None:
+        base = baseline.groupby(['scale', 'stage'])[['wall_s', 'peak_rss_mb']].median()
+        summary['wall vs baseline'] = summary['wall_s'] / base['wall_s'].reindex(summary.index)
+        summary['RSS vs baseline'] = summary['peak_rss_mb'] / base['peak_rss_mb'].reindex(summary.index)
+    return summary.round(3)
+
+#---------------------------------------------------------------
+
+def main(args):
+    for scale in args.scales:
+        if scale not in SCALES:
+            raise ValueError(f'Unknown scale {scale}; choose from {list(SCALES)}')
+    for stage in args.stages:
+        if stage not in STAGES:
+            raise ValueError(f'Unknown stage {stage}; choose from {list(STAGES)}')
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = run_benchmarks(args.scales, args.stages, args.data_dir, args.output,
+                             repeats=args.repeats, workers=args.workers, label=args.label)
+    baseline = None
+    if args.compare is not None:
+        baseline = pd.read_json(args.compare, lines=True)
+        if args.compare_label is not None:
+            baseline = baseline[baseline['label'] == args.compare_label]
+    print()
+    print(summarize(results, baseline).to_string())
+    print(f'\nAppended {len(results)} results to: {args.output}')
+
+#---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile the CBVCC pipeline stages on synthetic data.")
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], help=f'Dataset scales to run (choices: {", ".join(SCALES)})')
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), help=f'Stages to run (default: all of {", ".join(STAGES)})')
+    parser.add_argument('--data_dir', default='benchmark_data', help='Directory of the generated datasets, reused across runs (default: benchmark_data)')
+    parser.add_argument('--output', default='benchmark_results.jsonl', help='JSON lines file the results are appended to (default: benchmark_results.jsonl)')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed repeats per stage (default: 3)')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for the quality metrics stage (default: 1)')
+    parser.add_argument('--label', default=None, help='Label stored with every result, e.g. a branch name')
+    parser.add_argument('--compare', default=None, help='Earlier results file to report median ratios against')
+    parser.add_argument('--compare_label', default=None, help='Only compare against the results with this label')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,195 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import cv2
+
+# Synthetic CBVCC dataset with the same layout as the real one:
+#   videos/<subset>/<NN>/<class>/<NN>_<i>.avi   MJPG video patches
+#   tracks/<NN>/<class>/<NN>_<i>.csv            id,x,y,t tracks
+#   labels_train.csv, phase_{1,2}_GT.csv        file_id,gt without header
+#   phase_{1,2}_leaderboard.csv                 leaderboard logs
+#   uploaded_files/predicted<ts>.csv            prediction archives
+# Class 1 cells turn sharply once; class 0 cells move linearly or stay still.
+
+SUBSETS = [('training', '01'), ('validation', '02'), ('test', '03')]
+SUBSET_SHARE = [0.6, 0.2, 0.2]
+PHASE_START = {1: pd.Timestamp('2024-11-05 09:00:00'), 2: pd.Timestamp('2024-11-20 09:00:00')}
+
+DEFAULTS = {
+    'videos': 50,
+    'width': 128,
+    'height': 128,
+    'frames': 32,
+    'cells': 6,
+    'teams': 6,
+    'submissions': 10,
+    'seed': 0
+}
+
+#---------------------------------------------------------------
+
+def cell_tracks(rng, label, n_cells, W, H, T):
+    rows = []
+    for cell in range(n_cells):
+        pos = rng.uniform([8, 8], [W - 8, H - 8])
+        speed = 0 if label == 0 and rng.random() < 0.3 else rng.uniform(0.5, 2.5)
+        angle = rng.uniform(0, 2 * np.pi)
+        t_turn = rng.integers(T // 4, 3 * T // 4) if label == 1 else T
+        t0 = rng.integers(0, T // 4 + 1)
+        for t in range(t0, T):
+            if t == t_turn:
+                angle += rng.choice([-1, 1]) * rng.uniform(np.pi / 2, np.pi)
+            step = speed * np.array([np.cos(angle), np.sin(angle)])
+            pos = pos + step + rng.normal(0, 0.2, 2)
+            # Reflect at the borders
+            for k, size in enumerate((W, H)):
+                if not 2 <= pos[k] <= size - 3:
+                    pos[k] = np.clip(pos[k], 2, size - 3)
+                    angle = np.pi - angle if k == 0 else -angle
+            rows.append((cell, pos[0], pos[1], t))
+    return pd.DataFrame(rows, columns=['id', 'x', 'y', 't'])
+
+#---------------------------------------------------------------
+
+def render_video(fn_avi, tracks, rng, W, H, T, radius=3):
+    r = radius * 2
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    blob = 140 * np.exp(-(dx * dx + dy * dy) / (2 * radius ** 2))
+
+    writer = cv2.VideoWriter(fn_avi, cv2.VideoWriter_fourcc(*'MJPG'), 10, (W, H))
+    frames_t = tracks['t'].to_numpy()
+    xy = np.round(tracks[['x', 'y']].to_numpy()).astype(int)
+    for t in range(T):
+        frame = rng.normal(40, 8, (H, W))
+        for xi, yi in xy[frames_t == t]:
+            y0, y1 = max(0, yi - r), min(H, yi + r + 1)
+            x0, x1 = max(0, xi - r), min(W, xi + r + 1)
+            frame[y0:y1, x0:x1] += blob[y0 - yi + r:y1 - yi + r, x0 - xi + r:x1 - xi + r]
+        gray = np.clip(frame, 0, 255).astype(np.uint8)
+        writer.write(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+    writer.release()
+
+#---------------------------------------------------------------
+
+def write_videos(root, params, rng):
+    W, H, T = params['width'], params['height'], params['frames']
+    counts = np.floor(np.array(SUBSET_SHARE) * params['videos']).astype(int)
+    counts[0] += params['videos'] - counts.sum()
+
+    labels = {}
+    for (subset, series), n in zip(SUBSETS, counts):
+        labels[subset] = {}
+        for i in range(n):
+            label = int(rng.integers(0, 2))
+            name = f'{series}_{i}'
+            video_dir = os.path.join(root, 'videos', subset, series, str(label))
+            track_dir = os.path.join(root, 'tracks', series, str(label))
+            os.makedirs(video_dir, exist_ok=True)
+            os.makedirs(track_dir, exist_ok=True)
+
+            # Some patches contain only background
+            n_cells = int(rng.integers(0, params['cells'] + 1))
+            tracks = cell_tracks(rng, label, n_cells, W, H, T)
+            tracks.to_csv(os.path.join(track_dir, name + '.csv'), index=False)
+            render_video(os.path.join(video_dir, name + '.avi'), tracks, rng, W, H, T)
+            labels[subset][name + '.avi'] = label
+    return labels
+
+#---------------------------------------------------------------
+
+def write_submissions(root, params, labels, rng):
+    upload_dir = os.path.join(root, 'uploaded_files')
+    os.makedirs(upload_dir, exist_ok=True)
+    teams = [f'Team {k} (Institute {k})' for k in range(params['teams'])]
+    skills = rng.uniform(0.1, 0.8, len(teams))
+
+    for phase, subset in [(1, 'validation'), (2, 'test')]:
+        file_ids = np.array(list(labels[subset].keys()), dtype=object)
+        y = np.array(list(labels[subset].values()))
+        # Uploads name files without the zero padding of the GT (01_3.avi -> 1_3.avi)
+        upload_ids = pd.Series(file_ids).str.replace(r'^0(\d)_', r'\1_', regex=True)
+
+        rows = []
+        for k, team in enumerate(teams):
+            for s in range(params['submissions']):
+                ts = PHASE_START[phase] + pd.Timedelta(minutes=k * params['submissions'] + s)
+                # preprocess_submission moves the log back one hour before matching
+                file_ts = int((ts - pd.Timedelta(hours=1)).value // 10**9)
+                scores = np.clip(y * skills[k] + rng.random(len(y)) * (1 - skills[k]), 0, 1).round(4)
+                pd.DataFrame({'file_id': upload_ids, 'score': scores}).to_csv(
+                    os.path.join(upload_dir, f'predicted{file_ts}.csv'), header=False, index=False)
+                rows.append({
+                    'id_submission': len(rows),
+                    'team': team,
+                    'score': round(float(rng.uniform(0.3, 0.9)), 4),
+                    'ts': ts.strftime('%Y-%m-%d %H:%M:%S'),
+                    'auc': round(float(rng.uniform(0.5, 1)), 4)
+                })
+        pd.DataFrame(rows).to_csv(os.path.join(root, f'phase_{phase}_leaderboard.csv'), index=False)
+
+#---------------------------------------------------------------
+
+def write_gt(root, labels):
+    for subset, file_name in [('training', 'labels_train.csv'), ('validation', 'phase_1_GT.csv'), ('test', 'phase_2_GT.csv')]:
+        pd.Series(labels[subset]).to_csv(os.path.join(root, file_name), header=False)
+
+#---------------------------------------------------------------
+
+def dataset_paths(root):
+    return {
+        'root': root,
+        'datasets': [os.path.join(root, 'videos', subset) for subset, _ in SUBSETS],
+        'tracks': os.path.join(root, 'tracks'),
+        'gt_train': os.path.join(root, 'labels_train.csv'),
+        'gt1': os.path.join(root, 'phase_1_GT.csv'),
+        'gt2': os.path.join(root, 'phase_2_GT.csv'),
+        'submission1': os.path.join(root, 'phase_1_leaderboard.csv'),
+        'submission2': os.path.join(root, 'phase_2_leaderboard.csv'),
+        'timestamp_pattern': os.path.join(root, 'uploaded_files', 'predicted*.csv')
+    }
+
+#---------------------------------------------------------------
+
+def generate_dataset(root, **params):
+    params = {**DEFAULTS, **params}
+    params_file = os.path.join(root, 'dataset.json')
+    if os.path.exists(params_file):
+        with open(params_file) as f:
+            if json.load(f) == params:
+                return dataset_paths(root)
+        raise ValueError(f'{root} holds a synthetic dataset with different parameters')
+
+    rng = np.random.default_rng(params['seed'])
+    labels = write_videos(root, params, rng)
+    write_gt(root, labels)
+    write_submissions(root, params, labels, rng)
+    # dataset.json is written last and marks the dataset as complete
+    with open(params_file, 'w') as f:
+        json.dump(params, f)
+    return dataset_paths(root)
+
+#---------------------------------------------------------------
+
+def main(args):
+    params = {key: getattr(args, key) for key in DEFAULTS}
+    paths = generate_dataset(args.output, **params)
+    print(f"Written synthetic dataset with {args.videos} videos and {args.teams} teams to: {paths['root']}")
+
+#---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic CBVCC dataset for benchmarking.")
+    parser.add_argument('--output', required=True, help='Output directory of the dataset')
+    parser.add_argument('--videos', type=int, default=DEFAULTS['videos'], help='Number of video patches over training, validation and test')
+    parser.add_argument('--width', type=int, default=DEFAULTS['width'], help='Frame width in pixels')
+    parser.add_argument('--height', type=int, default=DEFAULTS['height'], help='Frame height in pixels')
+    parser.add_argument('--frames', type=int, default=DEFAULTS['frames'], help='Frames per video')
+    parser.add_argument('--cells', type=int, default=DEFAULTS['cells'], help='Maximum number of cells per video')
+    parser.add_argument('--teams', type=int, default=DEFAULTS['teams'], help='Number of teams')
+    parser.add_argument('--submissions', type=int, default=DEFAULTS['submissions'], help='Submissions per team and phase')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'], help='Random seed')
+
+    args = parser.parse_args()
+    main(args)
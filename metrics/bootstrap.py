@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+from concurrent.futures import ProcessPoolExecutor
+from metrics.overall_metrics import (
+    score_matrix,
+    rank_auc,
+    confusion_counts,
+    threshold_metrics,
+    cbvcc_score,
+    evaluate_models
+)
+
+#---------------------------------------------------------------
+
+def _bootstrap_batch(task):
+    scores, y_true, threshold, n_resamples, seed = task
+    rng = np.random.default_rng(seed)
+    pos_idx = np.flatnonzero(y_true == 1)
+    neg_idx = np.flatnonzero(y_true == 0)
+
+    # Stratified resampling keeps both classes in every replicate, so the AUC
+    # is always defined
+    idx = np.concatenate([
+        rng.choice(pos_idx, size=(len(pos_idx), n_resamples)),
+        rng.choice(neg_idx, size=(len(neg_idx), n_resamples))
+    ])
+    s = scores[idx]
+    y = y_true[idx]
+
+    auc_val = rank_auc(s, y)
+    tp, fp, fn, tn = confusion_counts(s, y, threshold)
+    precision, recall, balanced_acc = threshold_metrics(tp, fp, fn, tn)
+    return auc_val, cbvcc_score(auc_val, precision, recall, balanced_acc)
+
+#---------------------------------------------------------------
+
+def bootstrap_scores(all_data, n_boot=2000, threshold=0.5, seed=0, batch_size=250, workers=1):
+    scores, y_true, models = score_matrix(all_data)
+    keep = ~np.isnan(y_true)
+    scores, y_true = scores[keep], y_true[keep]
+
+    n_batches = int(np.ceil(n_boot / batch_size))
+    sizes = [min(batch_size, n_boot - b * batch_size) for b in range(n_batches)]
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    tasks = [(scores, y_true, threshold, size, ss) for size, ss in zip(sizes, seeds)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_bootstrap_batch, tasks))
+    else:
+        results = [_bootstrap_batch(task) for task in tasks]
+
+    auc_boot = np.concatenate([auc_val for auc_val, _ in results])
+    score_boot = np.concatenate([score for _, score in results])
+    return auc_boot, score_boot, models
+
+#---------------------------------------------------------------
+
+def bootstrap_report(all_data, n_boot=2000, threshold=0.5, seed=0, alpha=0.05, batch_size=250, workers=1):
+    auc_boot, score_boot, models = bootstrap_scores(all_data, n_boot, threshold, seed, batch_size, workers)
+
+    point = evaluate_models(all_data, threshold).set_index('Model').loc[models]
+
+    # Rank 1 is the best score of the replicate; ties share the best rank
+    ranks = rankdata(-score_boot, axis=1, method='min').astype(int)
+    lo, hi = 100 * alpha / 2, 100 * (1 - alpha / 2)
+
+    summary = pd.DataFrame({
+        'Model': models,
+        'Score': point['Score'].to_numpy(),
+        'Score CI low': np.round(np.percentile(score_boot, lo, axis=0), 3),
+        'Score CI high': np.round(np.percentile(score_boot, hi, axis=0), 3),
+        'AUC': point['AUC'].to_numpy(),
+        'AUC CI low': np.round(np.percentile(auc_boot, lo, axis=0), 3),
+        'AUC CI high': np.round(np.percentile(auc_boot, hi, axis=0), 3),
+        'Mean Rank': np.round(ranks.mean(axis=0), 2),
+        'P(Rank 1)': np.round((ranks == 1).mean(axis=0), 3)
+    })
+    summary = summary.sort_values(by='Score', ascending=False)
+
+    rank_dist = pd.DataFrame(
+        [np.bincount(ranks[:, j], minlength=len(models) + 1)[1:] / len(ranks) for j in range(len(models))],
+        index=pd.Index(models, name='Model'),
+        columns=[f'Rank {r}' for r in range(1, len(models) + 1)]
+    )
+    rank_dist = rank_dist.loc[summary['Model']]
+    return summary, rank_dist
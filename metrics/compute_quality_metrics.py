@@ -1,20 +1,31 @@
 import os
+import sys
+import json
+import hashlib
 import argparse
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import pdist, squareform
-from scipy.ndimage import distance_transform_edt
+from scipy.spatial import cKDTree
 import cv2
-from glob import glob
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics.frame_store import open_video, read_stored_frames, source_signature
+from metrics.track_store import load_track_store, file_spots
+from metrics.dataset_manifest import scan_dataset
+from metrics import profiling
 
 #---------------------------------------------------------------
 
-def load_paths(dataset_dirs, track_dir):
+def load_paths(dataset_dirs, track_dir, manifest=None):
+    scans = scan_dataset(list(dataset_dirs) + [track_dir], manifest)
     video_paths = []
     for path in dataset_dirs:
-        video_paths += sorted(glob(os.path.join(path, '**', '*.avi'), recursive=True))
+        video_paths += [os.path.join(path, entry['relpath']) for entry in scans[path] if entry['relpath'].endswith('.avi')]
 
-    track_paths = sorted(glob(os.path.join(track_dir, '**', '*.csv'), recursive=True))
+    track_paths = [os.path.join(track_dir, entry['relpath']) for entry in scans[track_dir] if entry['relpath'].endswith('.csv')]
 
     video_dict = {os.path.splitext(os.path.basename(v))[0]: v for v in video_paths}
     track_dict = {os.path.splitext(os.path.basename(t))[0]: t for t in track_paths}
@@ -24,89 +35,166 @@ def load_paths(dataset_dirs, track_dir):
 
 #---------------------------------------------------------------
 
-def process_videos(video_dict, track_dict, common_keys, output_csv):
-    SAMPLING_DISTANCE = 1
-    TH_DISTANCE_BG = 20 / 0.8
-    TH_DISTANCE_FG = 3 / 0.8
+SAMPLING_DISTANCE = 1
+TH_DISTANCE_BG = 20 / 0.8
+TH_DISTANCE_FG = 3 / 0.8
 
-    NUM_ENTRIES = len(video_dict)
-    overall = np.zeros((NUM_ENTRIES, 15))
-    overall_names = []
-    ifiles = 0
-
-    for key in sorted(common_keys):
-        fn_avi = video_dict[key]
-        file = track_dict[key]
-
-        try:
-            cap = cv2.VideoCapture(fn_avi)
-            if not cap.isOpened():
-                raise Exception(f'Error opening {fn_avi}')
-        except Exception as e:
-            print(f'Error initializing {fn_avi}: {e}')
+CACHE_VERSION = 2
+
+COLUMNS = ['SNR', 'CR', 'DEN avg', 'DEN std', 'NUM avg', 'NUM std',
+           'W', 'H', 'D', 'C', 'T', 'dxy', 'dz', 'dt', 'N.TRACKS']
+
+#---------------------------------------------------------------
+
+def disc_stencil(radius, inclusive=False):
+    r = int(np.ceil(radius))
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    # Same distances distance_transform_edt reports between pixel centres
+    dist = np.sqrt(dx * dx + dy * dy)
+    return dist <= radius if inclusive else dist < radius
+
+FG_STENCIL = disc_stencil(TH_DISTANCE_FG)
+NEAR_STENCIL = disc_stencil(TH_DISTANCE_BG, inclusive=True)
+
+#---------------------------------------------------------------
+
+def stamp_stencil(mask, stencil, y_sp, x_sp):
+    H, W = mask.shape
+    r = stencil.shape[0] // 2
+    for yi, xi in zip(y_sp, x_sp):
+        y0, y1 = max(0, yi - r), min(H, yi + r + 1)
+        x0, x1 = max(0, xi - r), min(W, xi + r + 1)
+        mask[y0:y1, x0:x1] |= stencil[y0 - yi + r:y1 - yi + r, x0 - xi + r:x1 - xi + r]
+
+#---------------------------------------------------------------
+
+def foreground_background(spots_XY, is_fg, is_near):
+    H, W = is_fg.shape
+    x_sp = np.clip(np.round(spots_XY[:, 0]).astype(int), 0, W - 1)
+    y_sp = np.clip(np.round(spots_XY[:, 1]).astype(int), 0, H - 1)
+    y_sp, x_sp = np.unique(np.stack([y_sp, x_sp]), axis=1)
+
+    is_fg[:] = False
+    is_near[:] = False
+    stamp_stencil(is_fg, FG_STENCIL, y_sp, x_sp)
+    stamp_stencil(is_near, NEAR_STENCIL, y_sp, x_sp)
+    return is_fg, ~is_near
+
+#---------------------------------------------------------------
+
+def read_frames(cap, H, W, T, needed=None):
+    for t in range(T):
+        if needed is not None and not needed[t]:
+            cap.grab()
             continue
+        ret, frame = cap.read()
+        if not ret:
+            yield t, np.zeros((H, W), dtype=np.uint8)
+            continue
+        yield t, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+#---------------------------------------------------------------
+
+_TRACK_STORES = {}
+
+def load_spots(file, track_store=None):
+    with profiling.accumulate('tracks_s'):
+        if track_store is None:
+            return pd.read_csv(file).to_numpy()
+        # One memory-mapped store per worker process instead of a CSV open per video
+        if track_store not in _TRACK_STORES:
+            _TRACK_STORES[track_store] = load_track_store(track_store)
+        return file_spots(_TRACK_STORES[track_store], os.path.splitext(os.path.basename(file))[0])
+
+#---------------------------------------------------------------
 
-        W, H, T = int(cap.get(3)), int(cap.get(4)), int(cap.get(7))
-        vx = vy = 1
+def process_video(fn_avi, file, frame_store=None, track_store=None):
+    if frame_store is not None:
+        return process_stored_video(fn_avi, file, frame_store, track_store)
 
-        zstack = np.zeros((H, W, T), dtype=np.uint8)
-        for t in range(T):
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            zstack[:, :, t] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    cap = cv2.VideoCapture(fn_avi)
+    if not cap.isOpened():
+        raise Exception(f'Error opening {fn_avi}')
+
+    W, H, T = int(cap.get(3)), int(cap.get(4)), int(cap.get(7))
+    try:
+        return video_metrics(load_spots(file, track_store), H, W, T,
+                             lambda needed: read_frames(cap, H, W, T, needed))
+    finally:
         cap.release()
 
-        spots_IXYT = pd.read_csv(file).to_numpy()
-        if len(spots_IXYT) == 0:
-            overall[ifiles, :] = [
-                np.nan, np.nan, np.nan, np.nan,
-                np.nan, np.nan, W, H, 1, 1, T,
-                vx, vy, 1, 0  # N.TRACKS = 0
-            ]
-            overall_names.append(key + '.avi')
-            ifiles += 1
+#---------------------------------------------------------------
+
+def process_stored_video(fn_avi, file, frame_store, track_store=None):
+    frames, meta = open_video(fn_avi, frame_store)
+    W, H, T = meta['W'], meta['H'], meta['T']
+    return video_metrics(load_spots(file, track_store), H, W, T,
+                         lambda needed: read_stored_frames(frames, H, W, T, needed))
+
+#---------------------------------------------------------------
+
+def video_metrics(spots_IXYT, H, W, T, frame_reader):
+    vx = vy = 1
+    if len(spots_IXYT) == 0:
+        return [
+            np.nan, np.nan, np.nan, np.nan,
+            np.nan, np.nan, W, H, 1, 1, T,
+            vx, vy, 1, 0  # N.TRACKS = 0
+        ]
+
+    spots_frames = group_spots_by_frame(spots_IXYT, T)
+    needed = np.array([len(spots_idx) > 0 for spots_idx in spots_frames], dtype=bool)
+    frames = profiling.timed_iter(frame_reader(needed), 'decode_s')
+    stats = frame_statistics(frames, spots_IXYT, spots_frames, H, W, T)
+    return stats + [W, H, 1, 1, T, vx, vy, 1, len(np.unique(spots_IXYT[:, 0]))]
+
+#---------------------------------------------------------------
+
+def group_spots_by_frame(spots_IXYT, T):
+    order = np.argsort(spots_IXYT[:, 3], kind='stable')
+    frames_sorted = spots_IXYT[order, 3]
+    lo = np.searchsorted(frames_sorted, np.arange(T), side='left')
+    hi = np.searchsorted(frames_sorted, np.arange(T), side='right')
+    return [order[a:b] for a, b in zip(lo, hi)]
+
+#---------------------------------------------------------------
+
+def nearest_spot_distance(spots_XY):
+    # Minimum inter-spot distance, with the 9999 self-distance sentinel of the
+    # original distance matrix so single spots and duplicates still give NaN
+    DEN = 9999
+    if len(spots_XY) > 1:
+        dist, _ = cKDTree(spots_XY).query(spots_XY, k=2)
+        DEN = min(np.min(dist[:, 1]), DEN)
+    return np.nan if DEN in [9999, 0] else DEN
+
+#---------------------------------------------------------------
+
+def frame_statistics(frames, spots_IXYT, spots_frames, H, W, T):
+    SNR_T = np.full((T, 1), np.nan)
+    CR_T = np.full((T, 1), np.nan)
+    HET_T = np.full((T, 1), np.nan)
+    DEN_T = np.full(T, np.nan)
+    NUM_T = np.full(T, np.nan)
+
+    is_fg = np.zeros((H, W), dtype=bool)
+    is_near = np.zeros((H, W), dtype=bool)
+
+    for tf, frame in frames:
+        spots_idx = spots_frames[tf]
+
+        with profiling.accumulate('stats_s'):
+            DEN_T[tf] = nearest_spot_distance(spots_IXYT[spots_idx, 1:3])
+            NUM_T[tf] = len(spots_idx)
+
+        with profiling.accumulate('fgbg_s'):
+            fg, bg = foreground_background(spots_IXYT[spots_idx, 1:3], is_fg, is_near)
+        if np.count_nonzero(fg) < 3 or np.count_nonzero(bg) < 3:
             continue
 
-        SNR_T = np.full((T, 1), np.nan)
-        CR_T = np.full((T, 1), np.nan)
-        HET_T = np.full((T, 1), np.nan)
-        DEN_T = np.full(T, np.nan)
-        NUM_T = np.full(T, np.nan)
-
-        x_sampling, y_sampling = np.meshgrid(range(0, W, 1), range(0, H, 1))
-        x_sampling = x_sampling.flatten()
-        y_sampling = y_sampling.flatten()
-
-        for tf in range(T):
-            spots_idx = np.where(spots_IXYT[:, 3] == tf)[0]
-            if len(spots_idx) == 0:
-                continue
-
-            spots_spots_dist = squareform(pdist(spots_IXYT[spots_idx, 1:3]))
-            np.fill_diagonal(spots_spots_dist, 9999)
-            DEN = np.min(spots_spots_dist)
-            DEN = np.nan if DEN in [9999, 0] else DEN
-            DEN_T[tf] = DEN
-            NUM_T[tf] = len(spots_spots_dist)
-
-            x_sp = np.round(spots_IXYT[spots_idx, 1]).astype(int)
-            y_sp = np.round(spots_IXYT[spots_idx, 2]).astype(int)
-            BW = np.zeros((H, W), dtype=bool)
-            for xi, yi in zip(x_sp, y_sp):
-                BW[min(H - 1, max(0, yi)), min(W - 1, max(0, xi))] = 1
-            E = distance_transform_edt(~BW)
-
-            is_bg = E[y_sampling, x_sampling] > TH_DISTANCE_BG
-            is_fg = E[y_sampling, x_sampling] < TH_DISTANCE_FG
-            x_bg, y_bg = x_sampling[is_bg], y_sampling[is_bg]
-            x_fg, y_fg = x_sampling[is_fg], y_sampling[is_fg]
-
-            if len(x_fg) < 3 or len(x_bg) < 3:
-                continue
-
-            FG_values = zstack[y_fg, x_fg, tf]
-            BG_values = zstack[y_bg, x_bg, tf]
+        with profiling.accumulate('stats_s'):
+            FG_values = frame[fg]
+            BG_values = frame[bg]
 
             FG_avg, FG_std = np.mean(FG_values), np.std(FG_values)
             BG_avg, BG_std = np.mean(BG_values), np.std(BG_values)
@@ -119,37 +207,162 @@ def process_videos(video_dict, track_dict, common_keys, output_csv):
             CR_T[tf, 0] = CR
             HET_T[tf, 0] = HET
 
-        mean_SNR = np.nanmean(SNR_T)
-        mean_CR = np.nanmean(CR_T)
-        mean_HET = np.nanmean(HET_T)
-        mean_DEN = np.nanmean(DEN_T)
-        std_DEN = np.nanstd(DEN_T)
-        mean_NUM = np.nanmean(NUM_T)
-        std_NUM = np.nanstd(NUM_T)
-
-        overall[ifiles, :] = [
-            mean_SNR, mean_CR, mean_DEN, std_DEN,
-            mean_NUM, std_NUM, W, H, 1, 1, T,
-            vx, vy, 1, len(np.unique(spots_IXYT[:, 0]))
-        ]
-        overall_names.append(key + '.avi')
-        ifiles += 1
+    mean_SNR = np.nanmean(SNR_T)
+    mean_CR = np.nanmean(CR_T)
+    mean_HET = np.nanmean(HET_T)
+    mean_DEN = np.nanmean(DEN_T)
+    std_DEN = np.nanstd(DEN_T)
+    mean_NUM = np.nanmean(NUM_T)
+    std_NUM = np.nanstd(NUM_T)
+
+    return [mean_SNR, mean_CR, mean_DEN, std_DEN, mean_NUM, std_NUM]
+
+#---------------------------------------------------------------
+
+def file_digest(cache_dir, path):
+    # Content digest of path, kept in a sidecar with the file's size and
+    # mtime so an unchanged file is not read again
+    signature = source_signature(path)
+    name = hashlib.sha256(signature['source'].encode()).hexdigest()
+    sidecar = os.path.join(cache_dir, 'sources', name[:2], name + '.json')
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            meta = json.load(f)
+        if all(meta.get(k) == v for k, v in signature.items()):
+            return meta['digest']
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    meta = dict(signature, digest=h.hexdigest())
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+    tmp_path = f'{sidecar}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, sidecar)
+    return meta['digest']
+
+#---------------------------------------------------------------
+
+def cache_key(fn_avi, file, cache_dir):
+    h = hashlib.sha256()
+    params = {
+        'version': CACHE_VERSION,
+        'SAMPLING_DISTANCE': SAMPLING_DISTANCE,
+        'TH_DISTANCE_BG': TH_DISTANCE_BG,
+        'TH_DISTANCE_FG': TH_DISTANCE_FG,
+    }
+    h.update(json.dumps(params, sort_keys=True).encode())
+    for path in (fn_avi, file):
+        h.update(file_digest(cache_dir, path).encode())
+    return h.hexdigest()
+
+#---------------------------------------------------------------
+
+def load_cached_row(cache_dir, digest):
+    path = os.path.join(cache_dir, digest[:2], digest + '.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['row']
 
-    overall = overall[:ifiles]
-    overall_names = overall_names[:ifiles]
-    columns = ['SNR', 'CR', 'DEN avg', 'DEN std', 'NUM avg', 'NUM std',
-               'W', 'H', 'D', 'C', 'T', 'dxy', 'dz', 'dt', 'N.TRACKS']
+#---------------------------------------------------------------
+
+def store_cached_row(cache_dir, digest, row, source):
+    path = os.path.join(cache_dir, digest[:2], digest + '.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'source': source, 'row': [float(v) for v in row]}, f)
+    os.replace(tmp_path, path)
+
+#---------------------------------------------------------------
+
+def _process_entry(entry, cache_dir=None, frame_store=None, track_store=None, trace=False):
+    # Returns the row, whether it came from the cache and, with trace=True,
+    # the profiling events of this video for the parent process
+    if trace:
+        profiling.enable()
+    since = profiling.mark()
+    key, _, _ = entry
+    with profiling.stage('video', video=key) as event:
+        row, cached = _compute_entry(entry, cache_dir, frame_store, track_store)
+        event['cached'] = cached
+        event['failed'] = row is None
+    return row, cached, profiling.pop_events(since)
+
+#---------------------------------------------------------------
+
+def _compute_entry(entry, cache_dir=None, frame_store=None, track_store=None):
+    key, fn_avi, file = entry
+    try:
+        if cache_dir is None:
+            return process_video(fn_avi, file, frame_store, track_store), False
+        digest = cache_key(fn_avi, file, cache_dir)
+        row = load_cached_row(cache_dir, digest)
+        if row is not None:
+            return row, True
+        row = process_video(fn_avi, file, frame_store, track_store)
+        store_cached_row(cache_dir, digest, row, key)
+        return row, False
+    except Exception as e:
+        print(f'Error processing {fn_avi}: {e}')
+        return None, False
+
+#---------------------------------------------------------------
+
+def process_videos(video_dict, track_dict, common_keys, output_csv, workers=1, cache_dir=None,
+                   frame_store=None, track_store=None):
+    entries = [(key, video_dict[key], track_dict[key]) for key in sorted(common_keys)]
+    process_entry = partial(_process_entry, cache_dir=cache_dir, frame_store=frame_store,
+                            track_store=track_store, trace=profiling.is_enabled())
+
+    if workers > 1:
+        chunksize = max(1, len(entries) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(process_entry, entries, chunksize=chunksize))
+    else:
+        results = [process_entry(entry) for entry in entries]
+
+    for _, _, events in results:
+        profiling.extend(events)
+
+    if cache_dir is not None:
+        n_cached = sum(cached for _, cached, _ in results)
+        print(f'Reused {n_cached} cached results, computed {len(results) - n_cached}.')
+
+    overall = []
+    overall_names = []
+    for (key, _, _), (row, _, _) in zip(entries, results):
+        if row is None:
+            continue
+        overall.append(row)
+        overall_names.append(key + '.avi')
 
-    df = pd.DataFrame(overall, columns=columns, index=overall_names)
+    overall = np.array(overall, dtype=float).reshape(-1, len(COLUMNS))
+    df = pd.DataFrame(overall, columns=COLUMNS, index=overall_names)
     df.to_csv(output_csv)
     print(f'\nWritten quality metrics to: {output_csv}')
     
 #---------------------------------------------------------------
 
 def main(args):
-    video_dict, track_dict, common_keys = load_paths(args.datasets, args.tracks)
+    if args.trace is not None:
+        profiling.enable()
+    with profiling.stage('load_paths'):
+        video_dict, track_dict, common_keys = load_paths(args.datasets, args.tracks, args.manifest)
     print(f'Found {len(common_keys)} valid video/track pairs.')
-    process_videos(video_dict, track_dict, common_keys, args.output)
+    if args.track_store is not None:
+        # Build or refresh the store once here so the workers only memory-map it
+        with profiling.stage('track_store'):
+            load_track_store(args.track_store, args.tracks)
+    with profiling.stage('process_videos', workers=args.workers):
+        process_videos(video_dict, track_dict, common_keys, args.output,
+                       workers=args.workers, cache_dir=args.cache_dir, frame_store=args.frame_store,
+                       track_store=args.track_store)
+    if args.trace is not None:
+        profiling.write_trace(args.trace)
 
 #---------------------------------------------------------------
 
@@ -158,6 +371,12 @@ if __name__ == "__main__":
     parser.add_argument('--datasets', nargs='+', required=True, help='List of dataset directories to search for videos.')
     parser.add_argument('--tracks', required=True, help='Path to the directory containing tracking CSVs.')
     parser.add_argument('--output', default='quality_overall.csv', help='Output CSV filename (default: quality_overall.csv)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (default: 1, serial)')
+    parser.add_argument('--cache_dir', default=None, help='Directory for the per-video result cache (default: no cache)')
+    parser.add_argument('--frame_store', default=None, help='Read frames from this memory-mapped frame store, converting videos on first use')
+    parser.add_argument('--track_store', default=None, help='Read tracks from this columnar track store, building it from --tracks if missing or stale')
+    parser.add_argument('--manifest', default=None, help='Dataset manifest JSON to reuse and refresh instead of a full scan of --datasets and --tracks')
+    parser.add_argument('--trace', default=None, help='Write a JSON trace with per-stage and per-video timings and memory to this file')
 
     args = parser.parse_args()
     main(args)
@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import struct
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# One os.scandir walk of the dataset folders, shared by generate_gt,
+# load_paths and load_track_counts. Every .avi and .csv is recorded with its
+# split (top-level folder), class label (a 0/1 parent folder), size and
+# mtime. Videos get W/H/T from the AVI header only when headers are asked
+# for, which by default is when a manifest is written; otherwise they stay
+# None and no video is opened. The manifest JSON keeps the
+# folders of each root; on refresh a folder whose mtime is unchanged is not
+# listed again, only its known files are stat'ed, and a file whose size and
+# mtime are unchanged keeps its header fields (read once if it has none yet). Hidden files and folders are skipped, as glob does.
+
+MANIFEST_VERSION = 1
+SUFFIXES = ('.avi', '.csv')
+# Folders modified this close to the scan may still change within the same
+# mtime tick, so they are listed again next time
+RACY_NS = 2 * 10**9
+
+#---------------------------------------------------------------
+
+def avi_header(path):
+    # Width, height and total frames from the avih chunk of the RIFF header
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    k = head.find(b'avih')
+    if head[:4] != b'RIFF' or k < 0 or len(head) < k + 48:
+        return None, None, None
+    fields = struct.unpack_from('<10I', head, k + 8)
+    return fields[8], fields[9], fields[4]
+
+#---------------------------------------------------------------
+
+def file_entry(root, relpath, st, headers=False):
+    parts = relpath.split(os.sep)
+    entry = {
+        'relpath': relpath,
+        'stem': os.path.splitext(parts[-1])[0],
+        'split': parts[0] if len(parts) > 1 else None,
+        'label': int(parts[-2]) if len(parts) > 1 and parts[-2] in ('0', '1') else None,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'W': None,
+        'H': None,
+        'T': None
+    }
+    if headers and relpath.endswith('.avi'):
+        entry['W'], entry['H'], entry['T'] = avi_header(os.path.join(root, relpath))
+    return entry
+
+def is_stale(entry, st, headers):
+    # The entry no longer matches the file, or lacks the header now asked for
+    return ((entry['size'], entry['mtime_ns']) != (st.st_size, st.st_mtime_ns)
+            or headers and entry['relpath'].endswith('.avi') and entry['W'] is None)
+
+#---------------------------------------------------------------
+
+def scan_folders(root, reldir, previous, start_ns, recursive=True, headers=False):
+    # {reldir: {'mtime_ns', 'subdirs', 'files'}} of reldir and, if recursive,
+    # of every folder below it; previous holds the folders of the last scan
+    mtime_ns = os.stat(os.path.join(root, reldir)).st_mtime_ns
+    old = previous.get(reldir)
+    if old is not None and old['mtime_ns'] == mtime_ns:
+        # A file rewritten in place does not change its folder's mtime
+        files = []
+        for entry in old['files']:
+            try:
+                st = os.stat(os.path.join(root, entry['relpath']))
+            except FileNotFoundError:
+                continue
+            if is_stale(entry, st, headers):
+                entry = file_entry(root, entry['relpath'], st, headers)
+            files.append(entry)
+        folder = {**old, 'files': files}
+    else:
+        old_files = {entry['relpath']: entry for entry in old['files']} if old is not None else {}
+        subdirs, files = [], []
+        with os.scandir(os.path.join(root, reldir)) as it:
+            for de in it:
+                if de.name.startswith('.'):
+                    continue
+                relpath = os.path.join(reldir, de.name)
+                if de.is_dir():
+                    subdirs.append(relpath)
+                elif de.name.endswith(SUFFIXES) and de.is_file():
+                    st = de.stat()
+                    entry = old_files.get(relpath)
+                    if entry is None or is_stale(entry, st, headers):
+                        entry = file_entry(root, relpath, st, headers)
+                    files.append(entry)
+        folder = {
+            'mtime_ns': mtime_ns if mtime_ns < start_ns - RACY_NS else None,
+            'subdirs': sorted(subdirs),
+            'files': sorted(files, key=lambda entry: entry['relpath'])
+        }
+
+    folders = {reldir: folder}
+    if recursive:
+        for subdir in folder['subdirs']:
+            folders.update(scan_folders(root, subdir, previous, start_ns, headers=headers))
+    return folders
+
+#---------------------------------------------------------------
+
+def scan_roots(roots, previous=None, workers=8, headers=False):
+    # The top-level folders (subsets) of all roots are walked in parallel
+    previous = previous or {}
+    start_ns = time.time_ns()
+    scans = {root: scan_folders(root, '', previous.get(root, {}), start_ns, recursive=False, headers=headers)
+             for root in roots}
+    jobs = [(root, subdir) for root in roots for subdir in scans[root]['']['subdirs']]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(
+            lambda job: scan_folders(job[0], job[1], previous.get(job[0], {}), start_ns, headers=headers),
+            jobs
+        ))
+    for (root, _), folders in zip(jobs, results):
+        scans[root].update(folders)
+    return scans
+
+#---------------------------------------------------------------
+
+def read_manifest(manifest_path):
+    if manifest_path is None or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest['roots'] if manifest.get('version') == MANIFEST_VERSION else {}
+
+def write_manifest(manifest_path, roots):
+    tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'roots': roots}, f)
+    os.replace(tmp_path, manifest_path)
+
+#---------------------------------------------------------------
+
+def scan_dataset(roots, manifest_path=None, workers=8, headers=None):
+    # {root: entries sorted by relpath}; with a manifest_path the last scan is
+    # refreshed and saved back, keeping the other roots it records. AVI headers
+    # are read if headers is True, or by default if a manifest is written
+    if headers is None:
+        headers = manifest_path is not None
+    keys = {root: os.path.abspath(root) for root in roots}
+    previous = read_manifest(manifest_path)
+    scans = scan_roots(sorted(set(keys.values())), previous, workers, headers)
+    if manifest_path is not None:
+        write_manifest(manifest_path, {**previous, **scans})
+    return {root: sorted((entry for folder in scans[key].values() for entry in folder['files']),
+                         key=lambda entry: entry['relpath'])
+            for root, key in keys.items()}
+
+#---------------------------------------------------------------
+
+def main(args):
+    scans = scan_dataset(args.roots, args.manifest, workers=args.workers)
+    for root, files in scans.items():
+        n_videos = sum(entry['relpath'].endswith('.avi') for entry in files)
+        print(f'{root}: {n_videos} videos, {len(files) - n_videos} CSV files')
+    print(f'Written dataset manifest to: {args.manifest}')
+
+#---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan CBVCC video and track folders into a persistent, incrementally refreshed manifest.")
+    parser.add_argument('--roots', nargs='+', required=True, help='Dataset and tracking directories to scan')
+    parser.add_argument('--manifest', required=True, help='Manifest JSON file, refreshed if it exists')
+    parser.add_argument('--workers', type=int, default=8, help='Number of threads walking the subsets (default: 8)')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata, norm
+from metrics.overall_metrics import score_matrix
+
+#---------------------------------------------------------------
+
+def delong_covariance(scores, y_true):
+    # Fast DeLong (Sun & Xu, 2014): midranks within positives, negatives and
+    # the pooled sample give the structural components of every model at once
+    pos = scores[y_true == 1]
+    neg = scores[y_true == 0]
+    m, n = len(pos), len(neg)
+
+    tx = rankdata(pos, axis=0)
+    ty = rankdata(neg, axis=0)
+    tz = rankdata(np.concatenate([pos, neg]), axis=0)
+
+    aucs = tz[:m].sum(axis=0) / (m * n) - (m + 1) / (2 * n)
+    v01 = (tz[:m] - tx) / n
+    v10 = 1 - (tz[m:] - ty) / m
+    sx = np.atleast_2d(np.cov(v01, rowvar=False))
+    sy = np.atleast_2d(np.cov(v10, rowvar=False))
+    return aucs, sx / m + sy / n
+
+#---------------------------------------------------------------
+
+def delong_pvalues(all_data):
+    scores, y_true, models = score_matrix(all_data)
+    # The paired test needs every model scored on the same files
+    keep = ~np.isnan(y_true) & ~np.isnan(scores).any(axis=1)
+    aucs, cov = delong_covariance(scores[keep], y_true[keep])
+
+    var = np.diag(cov)
+    diff_var = var[:, None] + var[None, :] - 2 * cov
+    diff = aucs[:, None] - aucs[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.abs(diff) / np.sqrt(diff_var)
+    pvalues = np.where(diff_var > 0, 2 * norm.sf(z), 1.0)
+
+    return pd.DataFrame(pvalues, index=pd.Index(models, name='Model'), columns=models)
@@ -4,21 +4,22 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from glob import glob
 import os
+from metrics.file_ids import file_codes, take
 
 #---------------------------------------------------------------
 
-def plot_class_distribution(counts, val, tes, tra, output_path='./classes.png'):
+def plot_class_distribution(counts, val, tes, tra, output_path='./classes.png', show=True):
     sns.set_style("whitegrid")
 
+    val_rows, tes_rows, tra_rows = (file_codes(gt.index, counts.index) for gt in (val, tes, tra))
     counts['Dataset'] = 'Training'
-    counts.loc[counts.index.isin(val.index), 'Dataset'] = 'Validation'
-    counts.loc[counts.index.isin(tes.index), 'Dataset'] = 'Test'
-    counts['gt'] = counts.index.map(lambda x: (
-        val.loc[x, 'gt'] if x in val.index else
-        (tes.loc[x, 'gt'] if x in tes.index else
-        (tra.loc[x, 'gt'] if x in tra.index else None))
-    )) 
-                 
+    counts.loc[val_rows >= 0, 'Dataset'] = 'Validation'
+    counts.loc[tes_rows >= 0, 'Dataset'] = 'Test'
+    # Class from the validation, else test, else training GT
+    rows = np.where(val_rows >= 0, val_rows, np.where(tes_rows >= 0, tes_rows + len(val), tra_rows + len(val) + len(tes)))
+    rows[(val_rows < 0) & (tes_rows < 0) & (tra_rows < 0)] = -1
+    counts['gt'] = take(np.concatenate([val['gt'].to_numpy(), tes['gt'].to_numpy(), tra['gt'].to_numpy()]), rows)
+
     grouped = counts.groupby(['Dataset', 'gt']).size().reset_index(name='file_count')
     custom_palette = {0: 'royalblue', 1: 'red'}
     plt.rcParams.update({'font.size': 14})
@@ -49,17 +50,20 @@ def plot_class_distribution(counts, val, tes, tra, output_path='./classes.png'):
     plt.legend(title='Classes', fontsize=16, title_fontsize=18)
     plt.tight_layout()
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.show()
+    if show:
+        plt.show()
     plt.close()
 
 #---------------------------------------------------------------
 
-def plot_metric_distributions(metric, val, tes, output_path='./metrics.png'):
+def plot_metric_distributions(metric, val, tes, output_path='./metrics.png', show=True):
     sns.set_style("whitegrid")
     # Determine dataset category for each file
+    in_val = file_codes(val.index, metric.index) >= 0
+    in_tes = file_codes(tes.index, metric.index) >= 0
     metric['Dataset'] = 'Training'  # Default all to Train
-    metric.loc[metric.index.isin(val.index), 'Dataset'] = 'Validation'
-    metric.loc[metric.index.isin(tes.index), 'Dataset'] = 'Test'
+    metric.loc[in_val, 'Dataset'] = 'Validation'
+    metric.loc[in_tes, 'Dataset'] = 'Test'
     n_tra = len(metric[metric['Dataset']=='Training'])
     dataset_labels = {
         'Training': f'Training (n={n_tra})',
@@ -72,8 +76,8 @@ def plot_metric_distributions(metric, val, tes, output_path='./metrics.png'):
         dataset_labels['Test']: 1
     }
     metric['Dataset'] = dataset_labels['Training']
-    metric.loc[metric.index.isin(val.index), 'Dataset'] = dataset_labels['Validation']
-    metric.loc[metric.index.isin(tes.index), 'Dataset'] = dataset_labels['Test']
+    metric.loc[in_val, 'Dataset'] = dataset_labels['Validation']
+    metric.loc[in_tes, 'Dataset'] = dataset_labels['Test']
     metric['Priority'] = metric['Dataset'].map(order)
     metric = metric.sort_values(by='Priority')
 
@@ -98,6 +102,7 @@ def plot_metric_distributions(metric, val, tes, output_path='./metrics.png'):
 
     plt.tight_layout()
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.show()
+    if show:
+        plt.show()
     plt.close()
 
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+# Canonical file IDs ('01_5.avi') and the integer codes used to join on them.
+# A source (GT, predictions, quality metrics, track kinematics) is looked up
+# once with file_codes, which gives the row of every target ID in the source
+# (-1 if it has none); its columns are then moved with integer gathers.
+
+#---------------------------------------------------------------
+
+def normalize_file_ids(file_ids):
+    # Zero-pad every single-digit '_'-separated part: '1_5.avi' -> '01_5.avi'
+    return file_ids.astype(str).str.replace(r'(?<![^_])(\d)(?![^_])', r'0\1', regex=True)
+
+#---------------------------------------------------------------
+
+def build_registry(*indexes):
+    # Sorted union of the file IDs of every source
+    ids = np.concatenate([np.asarray(index, dtype=object) for index in indexes]) if indexes else []
+    return pd.Index(np.unique(ids), dtype=object, name='file_id')
+
+#---------------------------------------------------------------
+
+def file_codes(source_index, file_ids):
+    return pd.Index(source_index).get_indexer(file_ids)
+
+#---------------------------------------------------------------
+
+def take(values, codes):
+    # values[codes], NaN where codes is -1; integer columns stay integer only
+    # when every ID is found, as with a pandas join
+    values = np.asarray(values)
+    found = codes >= 0
+    if found.all():
+        return values[codes]
+    dtype = values.dtype if values.dtype.kind == 'f' else (np.float64 if values.dtype.kind in 'iu' else object)
+    column = np.full(len(codes), np.nan, dtype=dtype)
+    column[found] = values[codes[found]]
+    return column
+
+#---------------------------------------------------------------
+
+def report_unmatched(source, file_ids, what='value'):
+    if len(file_ids):
+        examples = ', '.join(str(file_id) for file_id in file_ids[:3])
+        print(f'{source}: no {what} for {len(file_ids)} file IDs (e.g. {examples})')
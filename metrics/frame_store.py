@@ -0,0 +1,126 @@
+import os
+import json
+import argparse
+import numpy as np
+import cv2
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+
+#---------------------------------------------------------------
+
+def store_paths(store_dir, key):
+    return os.path.join(store_dir, key + '.npy'), os.path.join(store_dir, key + '.json')
+
+#---------------------------------------------------------------
+
+def source_signature(fn_avi):
+    st = os.stat(fn_avi)
+    return {'source': os.path.abspath(fn_avi), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+#---------------------------------------------------------------
+
+def load_metadata(store_dir, key):
+    _, meta_path = store_paths(store_dir, key)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+#---------------------------------------------------------------
+
+def is_current(fn_avi, store_dir, key):
+    meta = load_metadata(store_dir, key)
+    if meta is None:
+        return False
+    signature = source_signature(fn_avi)
+    return all(meta.get(k) == v for k, v in signature.items())
+
+#---------------------------------------------------------------
+
+def convert_video(fn_avi, store_dir, key=None):
+    if key is None:
+        key = os.path.splitext(os.path.basename(fn_avi))[0]
+    frames_path, meta_path = store_paths(store_dir, key)
+    os.makedirs(store_dir, exist_ok=True)
+
+    cap = cv2.VideoCapture(fn_avi)
+    if not cap.isOpened():
+        raise Exception(f'Error opening {fn_avi}')
+    W, H, T = int(cap.get(3)), int(cap.get(4)), int(cap.get(7))
+
+    # Frames that fail to decode stay all-zero, as in the in-memory zstack
+    tmp_path = f'{frames_path}.{os.getpid()}.tmp'
+    frames = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(T, H, W))
+    try:
+        for t in range(T):
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            frames[t] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frames.flush()
+    finally:
+        cap.release()
+        del frames
+    os.replace(tmp_path, frames_path)
+
+    meta = dict(source_signature(fn_avi), W=W, H=H, T=T)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+    return meta
+
+#---------------------------------------------------------------
+
+def open_video(fn_avi, store_dir, key=None):
+    if key is None:
+        key = os.path.splitext(os.path.basename(fn_avi))[0]
+    if not is_current(fn_avi, store_dir, key):
+        convert_video(fn_avi, store_dir, key)
+    meta = load_metadata(store_dir, key)
+    frames_path, _ = store_paths(store_dir, key)
+    return np.load(frames_path, mmap_mode='r'), meta
+
+#---------------------------------------------------------------
+
+def read_stored_frames(frames, H, W, T, needed=None):
+    for t in range(T):
+        if needed is not None and not needed[t]:
+            continue
+        yield t, frames[t]
+
+#---------------------------------------------------------------
+
+def _convert_entry(fn_avi, store_dir):
+    key = os.path.splitext(os.path.basename(fn_avi))[0]
+    try:
+        if not is_current(fn_avi, store_dir, key):
+            convert_video(fn_avi, store_dir, key)
+        return True
+    except Exception as e:
+        print(f'Error converting {fn_avi}: {e}')
+        return False
+
+#---------------------------------------------------------------
+
+def main(args):
+    video_paths = []
+    for path in args.datasets:
+        video_paths += sorted(glob(os.path.join(path, '**', '*.avi'), recursive=True))
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            done = list(executor.map(_convert_entry, video_paths, [args.store] * len(video_paths)))
+    else:
+        done = [_convert_entry(fn_avi, args.store) for fn_avi in video_paths]
+    print(f'Frame store {args.store}: {sum(done)}/{len(video_paths)} videos available.')
+
+#---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert CBVCC videos into a memory-mapped grayscale frame store.")
+    parser.add_argument('--datasets', nargs='+', required=True, help='List of dataset directories to search for videos.')
+    parser.add_argument('--store', required=True, help='Output directory of the frame store.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes (default: 1, serial)')
+
+    args = parser.parse_args()
+    main(args)
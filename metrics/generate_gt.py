@@ -1,22 +1,23 @@
 import os
+import sys
+import argparse
 import pandas as pd
 
-def generate_label_csv(root_dir, output_csv):
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics.dataset_manifest import scan_dataset
+
+def generate_label_csv(root_dir, output_csv, manifest=None):
+    # <subset>/<class>/<file>.avi entries, by subset, class and file name
+    files = scan_dataset([root_dir], manifest)[root_dir]
     records = []
-    for subset_folder in sorted(os.listdir(root_dir)):
-        subset_path = os.path.join(root_dir, subset_folder)
-        if not os.path.isdir(subset_path):
-            continue
-        for class_label in ['0', '1']:
-            class_folder = os.path.join(subset_path, class_label)
-            if not os.path.isdir(class_folder):
-                continue
-            for fname in sorted(os.listdir(class_folder)):
-                if fname.endswith('.avi'):
-                    records.append({
-                        'filename': fname,
-                        'class': int(class_label)
-                    })
+    for entry in sorted(files, key=lambda entry: entry['relpath'].split(os.sep)):
+        parts = entry['relpath'].split(os.sep)
+        if len(parts) == 3 and entry['label'] is not None and entry['relpath'].endswith('.avi'):
+            records.append({
+                'filename': parts[-1],
+                'class': entry['label']
+            })
     df = pd.DataFrame(records)
     df.to_csv(output_csv, index=False, header=False)
     print(f'CSV done: {output_csv}')
@@ -25,6 +26,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate CSV of filenames and classes from dataset folders.")
     parser.add_argument('--root_dir', help='Root directory of the dataset (e.g. Dataset/subset)')
     parser.add_argument('--output_csv', help='Output CSV filename')
+    parser.add_argument('--manifest', default=None, help='Dataset manifest JSON to reuse and refresh instead of a full scan')
 
     args = parser.parse_args()
-    generate_label_csv(args.root_dir, args.output_csv)
+    generate_label_csv(args.root_dir, args.output_csv, args.manifest)
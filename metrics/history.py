@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from metrics.upload_files import build_timestamp_index, match_timestamps, load_predictions
+from metrics.file_ids import file_codes, take
+from metrics.overall_metrics import rank_auc, confusion_counts, threshold_metrics, cbvcc_score
+
+#---------------------------------------------------------------
+
+def prediction_matrix(file_paths, gt_index, workers=8):
+    # (n_gt_files x n_files) float32 scores aligned on the integer position of
+    # each file ID in the GT; files without a prediction stay NaN
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        predictions = list(executor.map(load_predictions, file_paths))
+
+    matrix = np.full((len(gt_index), len(file_paths)), np.nan, dtype=np.float32)
+    for k, pred in enumerate(predictions):
+        matrix[:, k] = take(pred.to_numpy(dtype=np.float32), file_codes(pred.index, gt_index))
+    return matrix
+
+#---------------------------------------------------------------
+
+def evaluate_history(submission_df, file_timestamp_dict, gt_df, chunk_size=256, threshold=0.5,
+                     max_skew=None, workers=8):
+    timestamp_index = file_timestamp_dict
+    if isinstance(file_timestamp_dict, dict):
+        timestamp_index = build_timestamp_index(file_timestamp_dict)
+
+    df = submission_df.sort_values('timestamp', kind='stable').copy()
+    df['file_path'], _ = match_timestamps(df['timestamp'].to_numpy(), timestamp_index, max_skew)
+    unmatched = df['file_path'].isna()
+    if unmatched.any():
+        print(f'No matching prediction file for {unmatched.sum()} submissions (max_skew={max_skew}).')
+        df = df[~unmatched]
+
+    gt_index = pd.Index(gt_df.index)
+    y_true = gt_df['gt'].to_numpy(dtype=np.int8)
+
+    frames = []
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        path_codes, file_paths = pd.factorize(chunk['file_path'])
+        scores = prediction_matrix(list(file_paths), gt_index, workers)
+
+        auc_val = rank_auc(scores, y_true)
+        tp, fp, fn, tn = confusion_counts(scores, y_true, threshold)
+        precision, recall, balanced_acc = threshold_metrics(tp, fp, fn, tn)
+        score = cbvcc_score(auc_val, precision, recall, balanced_acc)
+        missing = np.isnan(scores).sum(axis=0)
+
+        frames.append(pd.DataFrame({
+            'team': chunk['team'].to_numpy(),
+            'ts': chunk['ts'].to_numpy(),
+            'Leaderboard Score': chunk['score'].to_numpy(),
+            'file_path': chunk['file_path'].to_numpy(),
+            'AUC': np.round(auc_val, 3)[path_codes],
+            'Precision': np.round(precision, 3)[path_codes],
+            'Recall': np.round(recall, 3)[path_codes],
+            'Balanced Accuracy': np.round(balanced_acc, 3)[path_codes],
+            'Score': np.round(score, 3)[path_codes],
+            'Missing': missing[path_codes]
+        }))
+
+    columns = ['team', 'ts', 'Leaderboard Score', 'file_path', 'AUC', 'Precision', 'Recall',
+               'Balanced Accuracy', 'Score', 'Missing']
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+#---------------------------------------------------------------
+
+def team_progression(history_df):
+    progression = history_df[['team', 'ts', 'Score']].sort_values(['team', 'ts'], kind='stable')
+    progression['Submission'] = progression.groupby('team').cumcount() + 1
+    progression['Best Score'] = progression.groupby('team')['Score'].cummax()
+    return progression.reset_index(drop=True)
@@ -0,0 +1,163 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics.track_store import load_tracks
+from metrics.file_ids import file_codes, take, report_unmatched
+
+# Track kinematics in pixels and frames (dxy = dt = 1, as in quality_overall.csv),
+# turning angles in degrees
+
+TRACK_COLUMNS = ['N.SPOTS', 'SPEED avg', 'SPEED max', 'TURN avg', 'TURN max', 'STRAIGHTNESS', 'MSD slope']
+VIDEO_COLUMNS = ['SPEED avg', 'SPEED max', 'TURN avg', 'TURN max', 'STRAIGHT avg', 'MSD slope']
+
+#---------------------------------------------------------------
+
+def group_mean(values, groups, n):
+    valid = np.isfinite(values)
+    total = np.bincount(groups[valid], weights=values[valid], minlength=n)
+    count = np.bincount(groups[valid], minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+#---------------------------------------------------------------
+
+def group_max(values, groups, n):
+    out = np.full(n, np.nan)
+    np.fmax.at(out, groups, values)
+    return out
+
+#---------------------------------------------------------------
+
+def msd_slope(x, y, t, track, n_tracks, max_lag=4):
+    # Log-log slope of the MSD over lags 1..max_lag spots, fitted for all
+    # tracks at once from per-(track, lag) sums
+    msd = np.zeros((n_tracks, max_lag))
+    tau = np.zeros((n_tracks, max_lag))
+    count = np.zeros((n_tracks, max_lag))
+    for k in range(1, max_lag + 1):
+        same = track[k:] == track[:-k]
+        groups = track[k:][same]
+        sd = (x[k:] - x[:-k])[same] ** 2 + (y[k:] - y[:-k])[same] ** 2
+        msd[:, k - 1] = np.bincount(groups, weights=sd, minlength=n_tracks)
+        tau[:, k - 1] = np.bincount(groups, weights=(t[k:] - t[:-k])[same], minlength=n_tracks)
+        count[:, k - 1] = np.bincount(groups, minlength=n_tracks)
+
+    w = (count > 0) & (msd > 0) & (tau > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lx = np.where(w, np.log(tau / count), 0)
+        ly = np.where(w, np.log(msd / count), 0)
+        n = w.sum(axis=1)
+        sx, sy = lx.sum(axis=1), ly.sum(axis=1)
+        sxx, sxy = (lx * lx).sum(axis=1), (lx * ly).sum(axis=1)
+        den = n * sxx - sx * sx
+        return np.where((n >= 2) & (den > 0), (n * sxy - sx * sy) / den, np.nan)
+
+#---------------------------------------------------------------
+
+def track_kinematics(store, max_lag=4):
+    # One sort by (file, id, t); every track is then a contiguous run of rows
+    file_idx = np.asarray(store['file'])
+    ids = np.asarray(store['id'])
+    t = np.asarray(store['t'])
+    order = np.lexsort((t, ids, file_idx))
+    file_idx, ids, t = file_idx[order], ids[order], t[order]
+    x, y = np.asarray(store['x'])[order], np.asarray(store['y'])[order]
+
+    new_track = np.ones(len(ids), dtype=bool)
+    new_track[1:] = (file_idx[1:] != file_idx[:-1]) | (ids[1:] != ids[:-1])
+    track = np.cumsum(new_track) - 1
+    first = np.flatnonzero(new_track)
+    n_tracks = len(first)
+    # An empty store has no tracks, and so no last spot
+    last = np.r_[first[1:] - 1, len(ids) - 1].astype(int) if n_tracks else first
+
+    # Steps between consecutive spots of a track
+    same = track[1:] == track[:-1]
+    step_track = track[:-1][same]
+    dx, dy = np.diff(x)[same], np.diff(y)[same]
+    dt = np.diff(t)[same]
+    dist = np.hypot(dx, dy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        speed = np.where(dt > 0, dist / dt, np.nan)
+
+    # Turning angles between consecutive steps of a track
+    turn_same = step_track[1:] == step_track[:-1]
+    turn_track = step_track[:-1][turn_same]
+    cross = (dx[:-1] * dy[1:] - dy[:-1] * dx[1:])[turn_same]
+    dot = (dx[:-1] * dx[1:] + dy[:-1] * dy[1:])[turn_same]
+    turn = np.abs(np.degrees(np.arctan2(cross, dot)))
+    turn[((dist[:-1] == 0) | (dist[1:] == 0))[turn_same]] = np.nan
+
+    path = np.bincount(step_track, weights=dist, minlength=n_tracks)
+    net = np.hypot(x[last] - x[first], y[last] - y[first])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        straightness = np.where(path > 0, net / path, np.nan)
+
+    tracks_df = pd.DataFrame({
+        'file_id': [store['files'][i]['stem'] + '.avi' for i in file_idx[first]],
+        'id': ids[first],
+        'N.SPOTS': last - first + 1,
+        'SPEED avg': group_mean(speed, step_track, n_tracks),
+        'SPEED max': group_max(speed, step_track, n_tracks),
+        'TURN avg': group_mean(turn, turn_track, n_tracks),
+        'TURN max': group_max(turn, turn_track, n_tracks),
+        'STRAIGHTNESS': straightness,
+        'MSD slope': msd_slope(x, y, t, track, n_tracks, max_lag)
+    })
+    return tracks_df, file_idx[first]
+
+#---------------------------------------------------------------
+
+def video_kinematics(store, max_lag=4):
+    tracks_df, track_file = track_kinematics(store, max_lag)
+    n_files = len(store['files'])
+    video_df = pd.DataFrame({
+        'SPEED avg': group_mean(tracks_df['SPEED avg'].to_numpy(), track_file, n_files),
+        'SPEED max': group_max(tracks_df['SPEED max'].to_numpy(), track_file, n_files),
+        'TURN avg': group_mean(tracks_df['TURN avg'].to_numpy(), track_file, n_files),
+        'TURN max': group_max(tracks_df['TURN max'].to_numpy(), track_file, n_files),
+        'STRAIGHT avg': group_mean(tracks_df['STRAIGHTNESS'].to_numpy(), track_file, n_files),
+        'MSD slope': group_mean(tracks_df['MSD slope'].to_numpy(), track_file, n_files)
+    }, index=[meta['stem'] + '.avi' for meta in store['files']])
+    # Same stem in two folders: the later file wins, as in load_paths
+    video_df = video_df[~video_df.index.duplicated(keep='last')]
+    return video_df, tracks_df
+
+#---------------------------------------------------------------
+
+def main(args):
+    store = load_tracks(args.tracks, args.track_store)
+    video_df, tracks_df = video_kinematics(store, max_lag=args.max_lag)
+    print(f'Computed kinematics of {len(tracks_df)} tracks in {len(video_df)} videos.')
+
+    if args.tracks_output is not None:
+        tracks_df.to_csv(args.tracks_output, index=False)
+        print(f'Written per-track kinematics to: {args.tracks_output}')
+
+    if args.quality is not None:
+        quality = pd.read_csv(args.quality, index_col=0)
+        codes = file_codes(video_df.index, quality.index)
+        report_unmatched('Tracks', quality.index[codes < 0], 'kinematics')
+        video_df = quality.drop(columns=VIDEO_COLUMNS, errors='ignore').assign(
+            **{column: take(video_df[column].to_numpy(), codes) for column in video_df.columns})
+    video_df.to_csv(args.output)
+    print(f'Written video kinematics to: {args.output}')
+
+#---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per-track and per-video track kinematics for CBVCC.")
+    parser.add_argument('--tracks', required=True, help='Path to the directory containing tracking CSVs.')
+    parser.add_argument('--track_store', default=None, help='Read tracks from this columnar track store, building it if missing or stale')
+    parser.add_argument('--quality', default=None, help='quality_overall.csv to join the per-video kinematics onto')
+    parser.add_argument('--output', default='quality_kinematics.csv', help='Output CSV filename (default: quality_kinematics.csv)')
+    parser.add_argument('--tracks_output', default=None, help='Optional CSV with the kinematics of every track')
+    parser.add_argument('--max_lag', type=int, default=4, help='Largest lag, in spots, of the MSD slope fit (default: 4)')
+
+    args = parser.parse_args()
+    main(args)
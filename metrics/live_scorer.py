@@ -0,0 +1,343 @@
+import os
+import re
+import csv
+import math
+import time
+import argparse
+import numpy as np
+from glob import glob
+
+# Python port of eval_code.php that scores each new predicted<ts>.csv upload
+# in O(N log N) and appends it to a leaderboard CSV
+
+METRIC_KEYS = ['TP', 'FP', 'FN', 'TN', 'Sensitivity', 'Specificity', 'Accuracy',
+               'Precision', 'Recall', 'Balanced Accuracy', 'AUC']
+LEADERBOARD_COLUMNS = ['file', 'timestamp'] + METRIC_KEYS + ['Score', 'Missing']
+
+_FLOAT_PREFIX = re.compile(r'\s*[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?')
+_NUMERIC = re.compile(r'[ \t\n\r\v\f]*[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?[ \t\n\r\v\f]*$')
+
+#---------------------------------------------------------------
+
+def php_floatval(value):
+    # floatval(): leading numeric prefix of the string, 0 if there is none
+    match = _FLOAT_PREFIX.match(value or '')
+    return float(match.group(0)) if match else 0.0
+
+#---------------------------------------------------------------
+
+def is_numeric(value):
+    return value is not None and _NUMERIC.match(value) is not None
+
+#---------------------------------------------------------------
+
+def php_float_string(value):
+    # (string)$float: 14 significant digits, exponent form like 1.0E-5
+    if math.isnan(value):
+        return 'NAN'
+    if math.isinf(value):
+        return 'INF' if value > 0 else '-INF'
+    text = f'{value:.14G}'
+    if 'E' in text:
+        mantissa, exponent = text.split('E')
+        if '.' not in mantissa:
+            mantissa += '.0'
+        text = f'{mantissa}E{int(exponent):+d}'
+    return text
+
+#---------------------------------------------------------------
+
+def php_ge(score, threshold):
+    # $predictedClass >= $th in PHP 8: a numeric string is compared as a
+    # number, null as a bool (every score passes) and any other text, including
+    # leading-digit text like '0.5x', with the score converted to a string
+    if threshold is None:
+        return True
+    if is_numeric(threshold):
+        return score >= float(threshold)
+    return php_float_string(score).encode() >= threshold.encode()
+
+#---------------------------------------------------------------
+
+def sort_thresholds(values):
+    # array_unique() and sort() of the predicted values. Numeric strings are
+    # ordered as numbers, text byte-wise against everything (null is ''), so
+    # each text goes after the numeric strings that are byte-wise smaller.
+    # Text that is not after a run of the smallest numbers (e.g. '5abc'
+    # among '6' and '10') has no consistent place: PHP's order then depends
+    # on its sort implementation, so the file is rejected.
+    unique = set('' if value is None else value for value in values)
+    numeric = sorted((value for value in unique if is_numeric(value)), key=lambda value: (float(value), value.encode()))
+    keys = [float(value) for value in numeric]
+    placed = {}
+    for text in sorted((value for value in unique if not is_numeric(value)), key=str.encode):
+        below = [value.encode() < text.encode() for value in numeric]
+        cut = sum(below)
+        if not all(below[:cut]) or (0 < cut < len(keys) and keys[cut - 1] == keys[cut]):
+            raise ValueError(f'prediction {text!r} has no consistent order among the numeric predictions in PHP')
+        placed.setdefault(cut, []).append(text)
+
+    thresholds = []
+    for k in range(len(numeric) + 1):
+        thresholds += placed.get(k, [])
+        if k < len(numeric):
+            thresholds.append(numeric[k])
+    return thresholds
+
+#---------------------------------------------------------------
+
+def php_round(value, places=4):
+    # round(): half away from zero after pre-rounding to 15 significant
+    # digits, so 0.28125 -> 0.2813 where Python's round() gives 0.2812
+    if not math.isfinite(value):
+        return value
+    scaled = float(f'{abs(value) * 10 ** places:.15g}')
+    return math.copysign(math.floor(scaled + 0.5) / 10 ** places, value)
+
+#---------------------------------------------------------------
+
+def parse_csv(file):
+    # Later rows overwrite earlier ones with the same ID, like $data[$row[0]];
+    # fgetcsv reads a blank line as [null], stored as $data[''] = null
+    data = {}
+    with open(file, newline='') as f:
+        for row in csv.reader(f):
+            data[row[0] if row else ''] = row[1] if len(row) > 1 else None
+    return data
+
+#---------------------------------------------------------------
+
+def load_ground_truth(gt_file):
+    ground_truth = parse_csv(gt_file)
+    ids = list(ground_truth.keys())
+    labels = np.array([php_floatval(v) for v in ground_truth.values()]) >= 0.5
+    return ids, labels
+
+#---------------------------------------------------------------
+
+def calculate_metrics(gt, predictions, default_threshold=0.5):
+    ids, labels = gt
+    values = [predictions.get(file_id) for file_id in ids]
+    found = np.array([v is not None for v in values], dtype=bool)
+    scores = np.array([php_floatval(v) for v, ok in zip(values, found) if ok])
+    pos = labels[found]
+    n_pos, n_neg = int(pos.sum()), int((~pos).sum())
+
+    # Thresholds are every distinct predicted value, including IDs absent from
+    # the GT; for each one count the matched scores >= threshold, by binary
+    # search for numeric ones and one comparison per score for text
+    thresholds = sort_thresholds(predictions.values())
+    numeric = np.array([is_numeric(th) for th in thresholds], dtype=bool)
+    tp = np.empty(len(thresholds), dtype=int)
+    fp = np.empty(len(thresholds), dtype=int)
+    values = np.array([float(th) for th, ok in zip(thresholds, numeric) if ok])
+    tp[numeric] = n_pos - np.searchsorted(np.sort(scores[pos]), values, side='left')
+    fp[numeric] = n_neg - np.searchsorted(np.sort(scores[~pos]), values, side='left')
+    for k in np.flatnonzero(~numeric):
+        passed = np.array([php_ge(score, thresholds[k]) for score in scores], dtype=bool)
+        tp[k] = np.sum(passed & pos)
+        fp[k] = np.sum(passed & ~pos)
+    tpr = tp / n_pos if n_pos > 0 else np.zeros(len(thresholds))
+    fpr = fp / n_neg if n_neg > 0 else np.zeros(len(thresholds))
+
+    # Trapezoidal rule over the ROC points in threshold order, summed left to right
+    auc = 0.0
+    if len(thresholds) > 1:
+        auc = float(np.cumsum(np.abs(fpr[1:] - fpr[:-1]) * (tpr[:-1] + tpr[1:]) / 2)[-1])
+
+    TP = int(np.sum(pos & (scores >= default_threshold)))
+    FN = n_pos - TP
+    FP = int(np.sum(~pos & (scores >= default_threshold)))
+    TN = n_neg - FP
+    return _threshold_report(TP, FP, FN, TN, auc), int((~found).sum())
+
+#---------------------------------------------------------------
+
+def _threshold_report(TP, FP, FN, TN, auc):
+    sensitivity = TP / (TP + FN) if TP + FN > 0 else 0
+    specificity = TN / (TN + FP) if TN + FP > 0 else 0
+    balanced_accuracy = (sensitivity + specificity) / 2
+    accuracy = (TP + TN) / (TP + TN + FP + FN) if TP + TN + FP + FN > 0 else float('nan')
+    precision = TP / (TP + FP) if TP + FP > 0 else 0
+    recall = TP / (TP + FN) if TP + FN > 0 else 0
+
+    return {
+        'TP': TP,
+        'FP': FP,
+        'FN': FN,
+        'TN': TN,
+        'Sensitivity': php_round(sensitivity, 4),
+        'Specificity': php_round(specificity, 4),
+        'Accuracy': php_round(accuracy, 4),
+        'Precision': php_round(precision, 4),
+        'Recall': php_round(recall, 4),
+        'Balanced Accuracy': php_round(balanced_accuracy, 4),
+        'AUC': php_round(auc, 4)
+    }
+
+#---------------------------------------------------------------
+
+def calculate_metrics_reference(ground_truth, predictions):
+    # Line-by-line port of calculate_metrics() in eval_code.php, O(thresholds x N)
+    thresholds = sort_thresholds(predictions.values())
+    roc_points = []
+    for th in thresholds:
+        TP = FP = FN = TN = 0
+        for file_id, true_class in ground_truth.items():
+            if predictions.get(file_id) is None:
+                continue
+            predicted_class = php_floatval(predictions[file_id])
+            true_class = php_floatval(true_class)
+            passed = php_ge(predicted_class, th)
+            if true_class >= 0.5 and passed: TP += 1
+            elif true_class >= 0.5 and not passed: FN += 1
+            elif true_class < 0.5 and passed: FP += 1
+            elif true_class < 0.5 and not passed: TN += 1
+        tpr = TP / (TP + FN) if TP + FN > 0 else 0
+        fpr = FP / (FP + TN) if FP + TN > 0 else 0
+        roc_points.append((fpr, tpr))
+
+    auc = 0
+    for i in range(1, len(roc_points)):
+        x1, y1 = roc_points[i - 1]
+        x2, y2 = roc_points[i]
+        auc += abs(x2 - x1) * (y1 + y2) / 2
+
+    TP = FP = FN = TN = 0
+    for file_id, true_class in ground_truth.items():
+        if predictions.get(file_id) is None:
+            continue
+        predicted_class = php_floatval(predictions[file_id])
+        true_class = php_floatval(true_class)
+        if true_class >= 0.5 and predicted_class >= 0.5: TP += 1
+        elif true_class >= 0.5 and predicted_class < 0.5: FN += 1
+        elif true_class < 0.5 and predicted_class >= 0.5: FP += 1
+        elif true_class < 0.5 and predicted_class < 0.5: TN += 1
+    return _threshold_report(TP, FP, FN, TN, auc)
+
+#---------------------------------------------------------------
+
+def file_timestamp(file):
+    match = re.search(r'predicted(\d+)\.csv$', os.path.basename(file))
+    return int(match.group(1)) if match else None
+
+#---------------------------------------------------------------
+
+def load_scored_files(leaderboard_csv):
+    if not os.path.exists(leaderboard_csv):
+        return set()
+    with open(leaderboard_csv, newline='') as f:
+        return {row['file'] for row in csv.DictReader(f)}
+
+#---------------------------------------------------------------
+
+def append_leaderboard(leaderboard_csv, rows):
+    write_header = not os.path.exists(leaderboard_csv) or os.path.getsize(leaderboard_csv) == 0
+    with open(leaderboard_csv, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=LEADERBOARD_COLUMNS)
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+        f.flush()
+
+#---------------------------------------------------------------
+
+def score_files(files, gt, leaderboard_csv, scored, check=False, ground_truth=None):
+    rows = []
+    for file in sorted(files, key=lambda x: (file_timestamp(x) or 0, x)):
+        if file in scored:
+            continue
+        try:
+            predictions = parse_csv(file)
+            metrics, missing = calculate_metrics(gt, predictions)
+        except Exception as e:
+            print(f'Error scoring {file}: {e}')
+            continue
+        if check:
+            reference = calculate_metrics_reference(ground_truth, predictions)
+            mismatch = [k for k in METRIC_KEYS if metrics[k] != reference[k]
+                        and not (isinstance(metrics[k], float) and math.isnan(metrics[k]) and math.isnan(reference[k]))]
+            if mismatch:
+                raise AssertionError(f'{file}: PHP port disagrees on {mismatch}')
+        row = {k: metrics[k] for k in METRIC_KEYS}
+        # CBVCC overall score from the rounded leaderboard metrics
+        score = 0.4 * row['AUC'] + 0.2 * (row['Precision'] + row['Recall'] + row['Balanced Accuracy'])
+        row.update(file=file, timestamp=file_timestamp(file), Score=php_round(score, 4), Missing=missing)
+        rows.append(row)
+        scored.add(file)
+        print(f"{os.path.basename(file)}: AUC={row['AUC']} Score={row['Score']} (missing {missing})")
+    if rows:
+        append_leaderboard(leaderboard_csv, rows)
+    return rows
+
+#---------------------------------------------------------------
+
+def read_queue(queue_file, offset):
+    if not os.path.exists(queue_file):
+        return [], offset
+    with open(queue_file) as f:
+        f.seek(offset)
+        lines = f.readlines()
+        # Leave a partially written last line for the next poll
+        if lines and not lines[-1].endswith('\n'):
+            lines = lines[:-1]
+        offset += sum(len(line.encode()) for line in lines)
+    return [line.strip() for line in lines if line.strip()], offset
+
+#---------------------------------------------------------------
+
+def settled_files(files, previous, scored):
+    # Uploads whose size and mtime are unchanged since the last poll; a file
+    # still being written is left for a later poll
+    current = {}
+    for file in files:
+        if file in scored:
+            continue
+        try:
+            st = os.stat(file)
+        except OSError:
+            continue
+        current[file] = (st.st_size, st.st_mtime_ns)
+    return [file for file, signature in current.items() if previous.get(file) == signature], current
+
+#---------------------------------------------------------------
+
+def main(args):
+    gt = load_ground_truth(args.gt)
+    ground_truth = parse_csv(args.gt) if args.check else None
+    scored = load_scored_files(args.leaderboard)
+    print(f'Loaded {len(gt[0])} GT entries; {len(scored)} files already on the leaderboard.')
+
+    if args.files:
+        score_files(args.files, gt, args.leaderboard, scored, args.check, ground_truth)
+        return
+
+    offset, signatures, polls = 0, {}, 0
+    while True:
+        if args.queue:
+            files, offset = read_queue(args.queue, offset)
+        else:
+            files, signatures = settled_files(glob(args.watch), signatures, scored)
+        score_files(files, gt, args.leaderboard, scored, args.check, ground_truth)
+        polls += 1
+        # With --watch a single run still takes two polls to see files settle
+        if args.once and (args.queue or polls == 2):
+            break
+        time.sleep(args.interval)
+
+#---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally score uploaded CBVCC prediction files (eval_code.php semantics).")
+    parser.add_argument('--gt', required=True, help='Ground truth CSV of the phase (e.g. phase_1_GT.csv)')
+    parser.add_argument('--leaderboard', required=True, help='Leaderboard CSV that new scores are appended to')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--watch', help='Glob of uploaded files to watch (e.g. "uploaded_files/predicted*.csv")')
+    source.add_argument('--queue', help='Text file that lists new prediction files, one path per line')
+    source.add_argument('--files', nargs='+', help='Score these prediction files once and exit')
+    parser.add_argument('--interval', type=float, default=5.0, help='Polling interval in seconds (default: 5)')
+    parser.add_argument('--once', action='store_true', help='Poll a single time (twice with --watch) and exit')
+    parser.add_argument('--check', action='store_true', help='Also run the literal port of eval_code.php and fail on any difference')
+
+    args = parser.parse_args()
+    main(args)
@@ -1,43 +1,22 @@
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
-import pandas as pd
-from sklearn.metrics import (
-    roc_auc_score, precision_score, recall_score, balanced_accuracy_score
-)
+from metrics.strata import stratified_scores
 
 #---------------------------------------------------------------
 
-def compute_score_per_cell_count(all_data, counts):
-    counts.index.names = ['file_id']
-    #counts = counts.rename(columns={'N.TRACKS': 'count'})
-    counts.drop(['SNR'], axis='columns', inplace=True)
-    all_datac = all_data.merge(counts, left_on='file_id', right_index=True, how='left')
-    metrics_dict = {'Num_Cells': [], 'Model': [], 'Score': []}
-
-    for column in all_datac.columns:
-        if column not in ['gt', 'N.TRACKS', 'file_id']:
-            for num_cells in sorted(all_datac['N.TRACKS'].unique()):
-                subset = all_datac[all_datac['N.TRACKS'] == num_cells]
-                if len(subset) > 1 and 0 < num_cells <= 7:
-                    predictions = (subset[column] >= 0.5).astype(int)
-
-                    auci = roc_auc_score(subset['gt'], subset[column])
-                    precision = precision_score(subset['gt'], predictions, zero_division=0)
-                    recall = recall_score(subset['gt'], predictions)
-                    balanced_acc = balanced_accuracy_score(subset['gt'], predictions)
-                    score = round(0.4 * auci + 0.2 * (precision + recall + balanced_acc), 3)
-
-                    metrics_dict['Num_Cells'].append(num_cells)
-                    metrics_dict['Model'].append(column)
-                    metrics_dict['Score'].append(score)
-
-    return pd.DataFrame(metrics_dict)
+def compute_score_per_cell_count(all_data, counts, threshold=0.5, max_cells=7):
+    # One stratum per number of tracked cells, 0 < N.TRACKS <= max_cells
+    metrics_df, _ = stratified_scores(all_data, counts, 'N.TRACKS', value_range=(1, max_cells + 1),
+                                      threshold=threshold)
+    return metrics_df.rename(columns={'N.TRACKS': 'Num_Cells'})
 
 #---------------------------------------------------------------
 
-def plot_score_vs_cells(all_data, counts, style_dict, clean_name_fn, output_path='test_ncell_with_rank.png'):
-    metrics_df = compute_score_per_cell_count(all_data, counts)
+def plot_score_vs_cells(all_data, counts, style_dict, clean_name_fn, output_path='test_ncell_with_rank.png', show=True,
+                        metrics_df=None):
+    if metrics_df is None:
+        metrics_df = compute_score_per_cell_count(all_data, counts)
 
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(7, 5),
                                    gridspec_kw={'height_ratios': [2, 0.2]}, sharex=True)
@@ -89,5 +68,6 @@ def plot_score_vs_cells(all_data, counts, style_dict, clean_name_fn, output_path
     plt.setp(ax2.get_xticklabels(), rotation=0)
     plt.tight_layout(pad=-0.5)
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.show()
-
+    if show:
+        plt.show()
+    plt.close(fig)
@@ -1,54 +1,113 @@
+import numpy as np
 import pandas as pd
-from sklearn.metrics import (
-    roc_auc_score, 
-    precision_score, 
-    recall_score, 
-    balanced_accuracy_score, 
-    confusion_matrix
-)
+from scipy.stats import rankdata
+from sklearn.metrics import roc_auc_score
+
+#---------------------------------------------------------------
+
+def score_matrix(all_data):
+    models = [column for column in all_data.columns if column != 'gt']
+    scores = all_data[models].to_numpy(dtype=float)
+    y_true = all_data['gt'].to_numpy(dtype=float)
+    return scores, y_true, models
+
+#---------------------------------------------------------------
+
+def _expand_labels(y_true, scores):
+    # Labels are indexed like the leading axes of scores: (n,) for an (n, m)
+    # matrix, (n, B) for a batch of B resamples of shape (n, B, m)
+    return y_true.reshape(y_true.shape + (1,) * (scores.ndim - y_true.ndim))
+
+#---------------------------------------------------------------
+
+def rank_auc(scores, y_true):
+    # Mann-Whitney AUC along axis 0 with average ranks for ties; NaN scores
+    # and NaN labels are left out of the ranking
+    y_true = _expand_labels(y_true, scores)
+    valid = ~np.isnan(scores) & ~np.isnan(y_true)
+    ranks = rankdata(np.where(valid, scores, np.nan), axis=0, nan_policy='omit')
+    pos = valid & (y_true == 1)
+    n_pos = pos.sum(axis=0)
+    n_neg = valid.sum(axis=0) - n_pos
+    rank_sum = np.where(pos, ranks, 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (rank_sum - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg)
+
+#---------------------------------------------------------------
+
+def confusion_counts(scores, y_true, threshold=0.5):
+    y_true = _expand_labels(y_true, scores)
+    valid = ~np.isnan(scores) & ~np.isnan(y_true)
+    pred = valid & (scores >= threshold)
+    pos = valid & (y_true == 1)
+    neg = valid & ~pos
+    tp = (pred & pos).sum(axis=0)
+    fp = (pred & neg).sum(axis=0)
+    fn = pos.sum(axis=0) - tp
+    tn = neg.sum(axis=0) - fp
+    return tp, fp, fn, tn
+
+#---------------------------------------------------------------
+
+def threshold_metrics(tp, fp, fn, tn):
+    # zero_division=0 for precision/recall; balanced accuracy averages the
+    # recalls of the classes present in y_true, as sklearn does
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        tpr = np.where(tp + fn > 0, tp / (tp + fn), np.nan)
+        tnr = np.where(tn + fp > 0, tn / (tn + fp), np.nan)
+        balanced_acc = np.where(np.isnan(tpr), tnr, np.where(np.isnan(tnr), tpr, (tnr + tpr) / 2))
+    return precision, recall, balanced_acc
+
+#---------------------------------------------------------------
+
+def cbvcc_score(auc_val, precision, recall, balanced_acc):
+    return 0.4 * auc_val + 0.2 * (precision + recall + balanced_acc)
+
+#---------------------------------------------------------------
+
+def near_rounding_boundary(values, decimals=3, tol=1e-9):
+    scaled = np.asarray(values, dtype=float) * 10 ** decimals
+    return np.abs(scaled - np.floor(scaled) - 0.5) < tol
+
+#---------------------------------------------------------------
+
+def refine_auc(auc_val, scores, y_true, refine):
+    # The rank AUC is exact while roc_auc_score integrates the ROC curve in
+    # floating point; where the two could round differently, keep sklearn's
+    # value so the published leaderboard numbers do not move
+    for j in np.flatnonzero(refine):
+        valid = ~np.isnan(scores[:, j]) & ~np.isnan(y_true)
+        if len(np.unique(y_true[valid])) == 2:
+            auc_val[j] = roc_auc_score(y_true[valid], scores[valid, j])
+    return auc_val
+
+#---------------------------------------------------------------
 
 def evaluate_models(all_data, threshold=0.5):
-    metrics_dict = {
-        'Model': [],
-        'AUC': [],
-        'Precision': [],
-        'Recall': [],
-        'Balanced Accuracy': [],
-        'Score': [],
-        'True Positive': [],
-        'True Negative': [],
-        'False Positive': [],
-        'False Negative': []
-    }
-
-    for column in all_data.columns:
-        if column == 'gt':
-            continue
-
-        predictions = (all_data[column] >= threshold).astype(int)
-        y_true = all_data['gt']
-
-        auc_val = roc_auc_score(y_true, all_data[column])
-        precision = precision_score(y_true, predictions, zero_division=0)
-        recall = recall_score(y_true, predictions, zero_division=0)
-        balanced_acc = balanced_accuracy_score(y_true, predictions)
-
-        tn, fp, fn, tp = confusion_matrix(y_true, predictions).ravel()
-        # CBVCC overall score
-        score = 0.4 * auc_val + 0.2 * (precision + recall + balanced_acc)
-
-        metrics_dict['Model'].append(column)
-        metrics_dict['AUC'].append(round(auc_val, 3))
-        metrics_dict['Precision'].append(round(precision, 3))
-        metrics_dict['Recall'].append(round(recall, 3))
-        metrics_dict['Balanced Accuracy'].append(round(balanced_acc, 3))
-        metrics_dict['Score'].append(round(score, 3))
-        metrics_dict['True Positive'].append(tp)
-        metrics_dict['True Negative'].append(tn)
-        metrics_dict['False Positive'].append(fp)
-        metrics_dict['False Negative'].append(fn)
-
-    metrics_df = pd.DataFrame(metrics_dict)
+    scores, y_true, models = score_matrix(all_data)
+
+    auc_val = rank_auc(scores, y_true)
+    tp, fp, fn, tn = confusion_counts(scores, y_true, threshold)
+    precision, recall, balanced_acc = threshold_metrics(tp, fp, fn, tn)
+    # CBVCC overall score
+    score = cbvcc_score(auc_val, precision, recall, balanced_acc)
+
+    auc_val = refine_auc(auc_val, scores, y_true, near_rounding_boundary(auc_val) | near_rounding_boundary(score))
+    score = cbvcc_score(auc_val, precision, recall, balanced_acc)
+
+    metrics_df = pd.DataFrame({
+        'Model': models,
+        'AUC': np.round(auc_val, 3),
+        'Precision': np.round(precision, 3),
+        'Recall': np.round(recall, 3),
+        'Balanced Accuracy': np.round(balanced_acc, 3),
+        'Score': np.round(score, 3),
+        'True Positive': tp,
+        'True Negative': tn,
+        'False Positive': fp,
+        'False Negative': fn
+    })
     metrics_df = metrics_df.sort_values(by='Score', ascending=False)
     return metrics_df
-
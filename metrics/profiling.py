@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+# Optional stage recorder. Nothing is recorded until enable() is called (or
+# after disable()); each finished stage becomes one event with its wall
+# time, CPU time, the RSS at its start and end (and their difference) and
+# the peak RSS of the process so far. The peak only ever grows, so it does
+# not show what a later stage itself allocated; the RSS delta does. Worker
+# processes record their own events and hand them back to the parent with
+# mark()/pop_events()/extend(). Open stages are tracked per thread, so
+# concurrent phases nest correctly.
+
+_events = None
+_local = threading.local()
+
+def _open_stages():
+    if not hasattr(_local, 'open'):
+        _local.open = []
+    return _local.open
+
+#---------------------------------------------------------------
+
+def enable():
+    global _events
+    if _events is None:
+        _events = []
+
+def disable():
+    # Drops the recorded events and stops recording
+    global _events
+    _events = None
+
+def is_enabled():
+    return _events is not None
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def current_rss_mb():
+    # Resident set size now; None where /proc is not available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return None
+
+#---------------------------------------------------------------
+
+@contextmanager
+def stage(name, **fields):
+    event = {'stage': name, **fields}
+    if _events is None:
+        yield event
+        return
+
+    event.update(pid=os.getpid(), start=time.time(), rss_start_mb=current_rss_mb())
+    open_stages = _open_stages()
+    open_stages.append(event)
+    wall, cpu, children = time.perf_counter(), time.process_time(), os.times()
+    try:
+        yield event
+    finally:
+        open_stages.pop()
+        children_end = os.times()
+        event['wall_s'] = time.perf_counter() - wall
+        event['cpu_s'] = time.process_time() - cpu
+        event['cpu_children_s'] = (children_end.children_user - children.children_user
+                                   + children_end.children_system - children.children_system)
+        event['rss_end_mb'] = current_rss_mb()
+        event['rss_delta_mb'] = (event['rss_end_mb'] - event['rss_start_mb']
+                                 if event['rss_start_mb'] is not None and event['rss_end_mb'] is not None else None)
+        event['peak_rss_mb'] = peak_rss_mb()
+        _events.append(event)
+
+#---------------------------------------------------------------
+
+@contextmanager
+def accumulate(key):
+    # Adds the time spent in the block to `key` of the innermost open stage
+    open_stages = _open_stages()
+    if not open_stages:
+        yield
+        return
+    event = open_stages[-1]
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        event[key] = event.get(key, 0.0) + time.perf_counter() - start
+
+#---------------------------------------------------------------
+
+def timed_iter(iterable, key):
+    # Yields from iterable, adding the time spent producing each item to `key`
+    open_stages = _open_stages()
+    if not open_stages:
+        yield from iterable
+        return
+    event = open_stages[-1]
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            event[key] = event.get(key, 0.0) + time.perf_counter() - start
+        yield item
+
+#---------------------------------------------------------------
+
+def mark():
+    return len(_events) if _events is not None else 0
+
+def pop_events(since=0):
+    if _events is None:
+        return []
+    events = _events[since:]
+    del _events[since:]
+    return events
+
+def extend(events):
+    if _events is not None:
+        _events.extend(events)
+
+#---------------------------------------------------------------
+
+def write_trace(path, **meta):
+    trace = {
+        'argv': sys.argv,
+        'pid': os.getpid(),
+        **meta,
+        'events': sorted(_events or [], key=lambda event: event['start'])
+    }
+    with open(path, 'w') as f:
+        json.dump(trace, f, indent=1)
+    print(f'Written trace of {len(trace["events"])} stages to: {path}')
@@ -11,20 +11,33 @@ def clean_model_name(name):
 
 #---------------------------------------------------------------
 
-def plot_roc_curves(all_data, output_path='./roc.png', style_dict=None):
-    y_true = all_data['gt']
+def roc_style_dict(all_data, style_dict=None):
+    # Line style per model, by column position; models already in style_dict keep theirs
     linestyles = ['--', '-', '-.', ':']
     colors = ['darkturquoise', 'gold', 'orangered', 'mediumslateblue', 'darkviolet', 'yellowgreen', 'royalblue']
 
+    if style_dict is None:
+        style_dict = {}
+
+    for i, model_name in enumerate(all_data.columns):
+        if model_name == 'gt' or model_name in style_dict:
+            continue
+        style_dict[model_name] = {'linestyle': linestyles[i % len(linestyles)], 'color': colors[i % len(colors)]}
+    return style_dict
+
+#---------------------------------------------------------------
+
+def plot_roc_curves(all_data, output_path='./roc.png', style_dict=None, show=True):
+    y_true = all_data['gt']
+
     roc_auc_dict = {}
     handles_dict = {}
 
-    if style_dict is None:
-        style_dict = {}
+    style_dict = roc_style_dict(all_data, style_dict)
 
     plt.figure(figsize=(6, 5), tight_layout=True)
 
-    for i, model_name in enumerate(all_data.columns):
+    for model_name in all_data.columns:
         if model_name == 'gt':
             continue
         y_pred = all_data[model_name]
@@ -32,11 +45,6 @@ def plot_roc_curves(all_data, output_path='./roc.png', style_dict=None):
         roc_auc = auc(fpr, tpr)
         roc_auc_dict[model_name] = roc_auc
 
-        if model_name not in style_dict:
-            linestyle = linestyles[i % len(linestyles)]
-            color = colors[i % len(colors)]
-            style_dict[model_name] = {'linestyle': linestyle, 'color': color}
-
         style = style_dict[model_name]
         line, = plt.plot(fpr, tpr, linestyle=style['linestyle'], color=style['color'], linewidth=1.5)
         handles_dict[model_name] = line
@@ -58,7 +66,8 @@ def plot_roc_curves(all_data, output_path='./roc.png', style_dict=None):
     plt.legend(handles=handles, labels=labels, loc='lower right')
 
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.show()
+    if show:
+        plt.show()
     plt.close()
 
     return style_dict
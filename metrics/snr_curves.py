@@ -3,44 +3,21 @@ import seaborn as sns
 import pandas as pd
 import numpy as np
 import re
-from sklearn.metrics import (
-    roc_auc_score, precision_score, recall_score, balanced_accuracy_score
-)
+from metrics.strata import stratified_scores
 
 #---------------------------------------------------------------
 
-def compute_score_by_snr(all_data, metric, max_snr=30, bins=15):
-    metric.index.names = ['file_id']
-    metric.drop(['N.TRACKS'], axis='columns', inplace=True)
-    all_datac = all_data.merge(metric, left_on='file_id', right_index=True, how='left')
-
-    metrics_dict = {'SNR': [], 'Model': [], 'Score': []}
-    snr_counts, snr_bins = np.histogram(all_datac['SNR'][all_datac['SNR'] < max_snr], bins=bins)
-
-    for column in all_datac.columns:
-        if column not in ['gt', 'SNR', 'file_id']:
-            for i in range(1, len(snr_bins)):
-                subset = all_datac[(all_datac['SNR'] >= snr_bins[i - 1]) & (all_datac['SNR'] < snr_bins[i])]
-                subset = subset[subset['SNR'] < max_snr]
-
-                if len(subset) > 1 and len(np.unique(subset['gt'])) > 1:
-                    predictions = (subset[column] >= 0.5).astype(int)
-                    auci = roc_auc_score(subset['gt'], subset[column])
-                    precision = precision_score(subset['gt'], predictions, zero_division=0)
-                    recall = recall_score(subset['gt'], predictions)
-                    balanced_acc = balanced_accuracy_score(subset['gt'], predictions)
-                    score = round(0.4 * auci + 0.2 * (precision + recall + balanced_acc), 3)
-
-                    metrics_dict['SNR'].append(snr_bins[i])
-                    metrics_dict['Model'].append(column)
-                    metrics_dict['Score'].append(score)
-
-    return pd.DataFrame(metrics_dict), snr_bins
+def compute_score_by_snr(all_data, metric, max_snr=30, bins=15, threshold=0.5):
+    return stratified_scores(all_data, metric, 'SNR', bins=bins, value_range=(-np.inf, max_snr),
+                             threshold=threshold)
 
 #---------------------------------------------------------------
 
-def plot_score_vs_snr(all_data, quality_metric, style_dict, clean_name_fn, output_path='test_snr_with_rank.png'):
-    metrics_df, snr_bins = compute_score_by_snr(all_data, quality_metric)
+def plot_score_vs_snr(all_data, quality_metric, style_dict, clean_name_fn, output_path='test_snr_with_rank.png', show=True,
+                      strata=None):
+    if strata is None:
+        strata = compute_score_by_snr(all_data, quality_metric)
+    metrics_df, snr_bins = strata
 
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(7, 5),
                                    gridspec_kw={'height_ratios': [2, 0.2]}, sharex=False)
@@ -101,5 +78,6 @@ def plot_score_vs_snr(all_data, quality_metric, style_dict, clean_name_fn, outpu
     plt.setp(ax2.get_xticklabels(), rotation=0)
     plt.tight_layout(pad=-1.7)
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
-    plt.show()
-
+    if show:
+        plt.show()
+    plt.close(fig)
@@ -0,0 +1,93 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+import importlib.util
+from metrics import profiling
+
+# Persistent cache of pipeline stage outputs. A stage is keyed on a digest of
+# its parameters, the keys of the stages it depends on and the source of the
+# modules that implement it; its output is pickled under
+# <cache_dir>/<stage>/<key>.pkl. Without a cache_dir every stage just runs.
+
+CACHE_VERSION = 1
+
+#---------------------------------------------------------------
+
+def digest(*parts):
+    h = hashlib.sha256()
+    h.update(json.dumps([CACHE_VERSION, *parts], sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+#---------------------------------------------------------------
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+#---------------------------------------------------------------
+
+def files_signature(paths):
+    # Name, size and mtime of every file, without reading them
+    entries = []
+    for path in sorted(paths):
+        st = os.stat(path)
+        entries.append((path, st.st_size, st.st_mtime_ns))
+    return digest(entries)
+
+#---------------------------------------------------------------
+
+def source_digest(*module_names):
+    # Located without importing, so plot modules stay unloaded
+    return digest([file_digest(importlib.util.find_spec(name).origin) for name in module_names])
+
+#---------------------------------------------------------------
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+#---------------------------------------------------------------
+
+def run_stage(cache_dir, name, key, fn, **fields):
+    with profiling.stage(name, **fields) as event:
+        if cache_dir is None:
+            return fn()
+        path = os.path.join(cache_dir, name, key + '.pkl')
+        event['cached'] = os.path.exists(path)
+        if event['cached']:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        result = fn()
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _write_atomic(path, write)
+        return result
+
+#---------------------------------------------------------------
+
+def cached_files(cache_dir, key, output_paths):
+    # Copies the cached renders of a figure group to output_paths; False if
+    # any of them is missing
+    sources = [os.path.join(cache_dir, 'figures', key, os.path.basename(p)) for p in output_paths]
+    if not all(os.path.exists(src) for src in sources):
+        return False
+    for src, dst in zip(sources, output_paths):
+        shutil.copyfile(src, dst)
+    return True
+
+#---------------------------------------------------------------
+
+def store_files(cache_dir, key, output_paths):
+    for path in output_paths:
+        _write_atomic(os.path.join(cache_dir, 'figures', key, os.path.basename(path)),
+                      lambda tmp_path: shutil.copyfile(path, tmp_path))
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+from metrics.overall_metrics import (
+    score_matrix,
+    rank_auc,
+    confusion_counts,
+    threshold_metrics,
+    cbvcc_score,
+    near_rounding_boundary,
+    refine_auc
+)
+from metrics.file_ids import file_codes, take, report_unmatched
+
+#---------------------------------------------------------------
+
+def stratum_codes(values, bins=None, quantiles=None, value_range=None):
+    # Strata are the distinct values (bins=None), `bins` equal-width bins or
+    # explicit edges, or `quantiles` equal-count bins; values outside
+    # value_range = [low, high) and NaN get code -1. Binned strata are
+    # labelled by their right edge and are closed on the left, open on the
+    # right (quantile bins close the last one).
+    values = np.asarray(values, dtype=float)
+    in_range = ~np.isnan(values)
+    if value_range is not None:
+        low, high = value_range
+        in_range &= (values >= low) & (values < high)
+
+    if bins is None and quantiles is None:
+        labels, codes = np.unique(values[in_range], return_inverse=True)
+        all_codes = np.full(len(values), -1)
+        all_codes[in_range] = codes
+        return all_codes, labels, None
+
+    if quantiles is not None:
+        edges = np.unique(np.quantile(values[in_range], np.linspace(0, 1, quantiles + 1)))
+    elif np.ndim(bins) == 0:
+        edges = np.histogram_bin_edges(values[in_range], bins=bins)
+    else:
+        edges = np.asarray(bins, dtype=float)
+
+    codes = np.searchsorted(edges, values, side='right') - 1
+    if quantiles is not None:
+        # Quantile bins must cover every value, so the last one is closed
+        codes[values == edges[-1]] = len(edges) - 2
+    codes[~in_range | (codes >= len(edges) - 1)] = -1
+    return codes, edges[1:], edges
+
+#---------------------------------------------------------------
+
+def stratified_scores(all_data, quality, column, bins=None, quantiles=None, value_range=None,
+                      threshold=0.5, min_size=2):
+    scores, y_true, models = score_matrix(all_data)
+    quality_rows = file_codes(quality.index, all_data.index)
+    values = take(quality[column].to_numpy(dtype=float), quality_rows)
+    report_unmatched('Quality metrics', all_data.index[quality_rows < 0], column)
+    codes, labels, edges = stratum_codes(values, bins, quantiles, value_range)
+
+    # One stable sort by stratum code, then score every model per stratum
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(len(labels)), side='left')
+    ends = np.searchsorted(sorted_codes, np.arange(len(labels)), side='right')
+
+    stratum_scores = np.full((len(labels), len(models)), np.nan)
+    for k, (a, b) in enumerate(zip(starts, ends)):
+        rows = order[a:b]
+        y = y_true[rows]
+        if len(rows) < min_size or len(np.unique(y[~np.isnan(y)])) < 2:
+            continue
+        s = scores[rows]
+        auc_val = rank_auc(s, y)
+        precision, recall, balanced_acc = threshold_metrics(*confusion_counts(s, y, threshold))
+        score = cbvcc_score(auc_val, precision, recall, balanced_acc)
+        auc_val = refine_auc(auc_val, s, y, near_rounding_boundary(score))
+        stratum_scores[k] = cbvcc_score(auc_val, precision, recall, balanced_acc)
+
+    keep = ~np.isnan(stratum_scores.T)
+    metrics_df = pd.DataFrame({
+        column: np.tile(labels, len(models))[keep.ravel()],
+        'Model': np.repeat(models, len(labels))[keep.ravel()],
+        'Score': np.round(stratum_scores.T[keep], 3)
+    })
+    return metrics_df, edges
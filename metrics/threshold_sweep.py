@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from metrics.overall_metrics import (
+    score_matrix,
+    rank_auc,
+    confusion_counts,
+    threshold_metrics,
+    cbvcc_score
+)
+
+SWEEP_COLUMNS = ['Model', 'Threshold', 'Precision', 'Recall', 'Balanced Accuracy', 'Score',
+                 'True Positive', 'True Negative', 'False Positive', 'False Negative']
+
+#---------------------------------------------------------------
+
+def sweep_model(scores, y_true):
+    # One descending sort; the counts for "predict 1 if score >= th" at every
+    # distinct score th are the cumulative sums at the end of each tie run
+    order = np.argsort(-scores, kind='stable')
+    s = scores[order]
+    y = y_true[order] == 1
+    tps = np.cumsum(y)
+    fps = np.cumsum(~y)
+    last = np.r_[np.flatnonzero(s[1:] != s[:-1]), len(s) - 1]
+
+    tp, fp = tps[last], fps[last]
+    return s[last], tp, fp, tps[-1] - tp, fps[-1] - fp
+
+#---------------------------------------------------------------
+
+def threshold_sweep(all_data):
+    scores, y_true, models = score_matrix(all_data)
+    auc_val = rank_auc(scores, y_true)
+
+    # A model that scored none of the labelled files has no thresholds
+    frames = []
+    for j, model in enumerate(models):
+        valid = ~np.isnan(scores[:, j]) & ~np.isnan(y_true)
+        if not valid.any():
+            continue
+        thresholds, tp, fp, fn, tn = sweep_model(scores[valid, j], y_true[valid])
+        precision, recall, balanced_acc = threshold_metrics(tp, fp, fn, tn)
+        frames.append(pd.DataFrame({
+            'Model': model,
+            'Threshold': thresholds,
+            'Precision': precision,
+            'Recall': recall,
+            'Balanced Accuracy': balanced_acc,
+            'Score': cbvcc_score(auc_val[j], precision, recall, balanced_acc),
+            'True Positive': tp,
+            'True Negative': tn,
+            'False Positive': fp,
+            'False Negative': fn
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SWEEP_COLUMNS)
+
+#---------------------------------------------------------------
+
+def best_thresholds(all_data, sweep=None, threshold=0.5):
+    if sweep is None:
+        sweep = threshold_sweep(all_data)
+
+    scores, y_true, models = score_matrix(all_data)
+    auc_val = rank_auc(scores, y_true)
+    precision, recall, balanced_acc = threshold_metrics(*confusion_counts(scores, y_true, threshold))
+    default_score = pd.Series(cbvcc_score(auc_val, precision, recall, balanced_acc), index=models)
+
+    # Models without sweep rows (or defined scores) get NaN
+    scored = sweep.dropna(subset=['Score'])
+    best = scored.loc[scored.groupby('Model', sort=False)['Score'].idxmax()].set_index('Model').reindex(models)
+    best_df = pd.DataFrame({
+        'Model': models,
+        'Best Threshold': best['Threshold'].to_numpy(dtype=float),
+        'Best Score': best['Score'].astype(float).round(3).to_numpy(),
+        f'Score at {threshold}': default_score.round(3).to_numpy()
+    })
+    return best_df.sort_values(by='Best Score', ascending=False)
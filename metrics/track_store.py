@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics.dataset_manifest import scan_dataset
+
+# Tracking CSVs packed into one columnar store: file/id/x/y/t .npy columns
+# (rows of a file are contiguous), offsets.npy with n_files + 1 row offsets
+# and files.json with the source path, size and mtime of each CSV
+
+COLUMNS = ['id', 'x', 'y', 't']
+
+#---------------------------------------------------------------
+
+def scan_track_files(track_dir, manifest=None):
+    return [{key: entry[key] for key in ['stem', 'relpath', 'size', 'mtime_ns']}
+            for entry in scan_dataset([track_dir], manifest)[track_dir] if entry['relpath'].endswith('.csv')]
+
+#---------------------------------------------------------------
+
+def is_current(track_dir, store_dir):
+    files_path = os.path.join(store_dir, 'files.json')
+    if not os.path.exists(files_path):
+        return False
+    with open(files_path) as f:
+        return json.load(f) == scan_track_files(track_dir)
+
+#---------------------------------------------------------------
+
+def read_track_columns(track_dir, files, workers=8):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tables = list(executor.map(
+            lambda meta: pd.read_csv(os.path.join(track_dir, meta['relpath'])).to_numpy(dtype=float)[:, :len(COLUMNS)],
+            files
+        ))
+
+    lengths = np.array([len(table) for table in tables], dtype=np.int64)
+    data = np.concatenate(tables) if tables else np.zeros((0, len(COLUMNS)))
+    columns = {column: np.ascontiguousarray(data[:, k]) for k, column in enumerate(COLUMNS)}
+    columns['file'] = np.repeat(np.arange(len(files), dtype=np.int32), lengths)
+    columns['offsets'] = np.concatenate([[0], np.cumsum(lengths)])
+    return columns
+
+#---------------------------------------------------------------
+
+def build_track_store(track_dir, store_dir, workers=8):
+    files = scan_track_files(track_dir)
+    columns = read_track_columns(track_dir, files, workers)
+
+    os.makedirs(store_dir, exist_ok=True)
+    for column in ['file', 'offsets'] + COLUMNS:
+        np.save(os.path.join(store_dir, column + '.npy'), columns[column])
+    # files.json is written last and marks the store as complete
+    with open(os.path.join(store_dir, 'files.json'), 'w') as f:
+        json.dump(files, f)
+    return files
+
+#---------------------------------------------------------------
+
+def load_track_store(store_dir, track_dir=None):
+    if track_dir is not None and not is_current(track_dir, store_dir):
+        build_track_store(track_dir, store_dir)
+
+    with open(os.path.join(store_dir, 'files.json')) as f:
+        files = json.load(f)
+    store = {column: np.load(os.path.join(store_dir, column + '.npy'), mmap_mode='r')
+             for column in ['file'] + COLUMNS}
+    store['offsets'] = np.load(os.path.join(store_dir, 'offsets.npy'))
+    store['files'] = files
+    store['index'] = {meta['stem']: i for i, meta in enumerate(files)}
+    return store
+
+#---------------------------------------------------------------
+
+def load_tracks(track_dir=None, store_dir=None, workers=8):
+    # Store columns from the track store if there is one, else straight from the CSVs
+    if store_dir is not None:
+        return load_track_store(store_dir, track_dir)
+    files = scan_track_files(track_dir)
+    store = read_track_columns(track_dir, files, workers)
+    store['files'] = files
+    store['index'] = {meta['stem']: i for i, meta in enumerate(files)}
+    return store
+
+#---------------------------------------------------------------
+
+def file_spots(store, stem):
+    # Same (N, 4) id/x/y/t array as pd.read_csv(track_csv).to_numpy()
+    i = store['index'][stem]
+    a, b = store['offsets'][i], store['offsets'][i + 1]
+    return np.column_stack([store[column][a:b] for column in COLUMNS])
+
+#---------------------------------------------------------------
+
+def track_counts(store):
+    # Number of unique track IDs per file, from one sort of (file, id) pairs
+    file_idx = np.asarray(store['file'])
+    ids = np.asarray(store['id'])
+    order = np.lexsort((ids, file_idx))
+    f, t = file_idx[order], ids[order]
+    first = np.ones(len(f), dtype=bool)
+    first[1:] = (f[1:] != f[:-1]) | (t[1:] != t[:-1])
+    return np.bincount(f[first], minlength=len(store['files']))
+
+#---------------------------------------------------------------
+
+def main(args):
+    if not args.force and is_current(args.tracks, args.store):
+        print(f'Track store {args.store} is up to date.')
+        return
+    files = build_track_store(args.tracks, args.store, workers=args.workers)
+    print(f'Written track store for {len(files)} tracking files to: {args.store}')
+
+#---------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack CBVCC tracking CSVs into a columnar, memory-mappable store.")
+    parser.add_argument('--tracks', required=True, help='Path to the directory containing tracking CSVs.')
+    parser.add_argument('--store', required=True, help='Output directory of the track store.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of threads reading CSVs (default: 8)')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the store is up to date')
+
+    args = parser.parse_args()
+    main(args)
@@ -2,35 +2,111 @@ import pandas as pd
 import numpy as np
 from glob import glob
 import os
+from concurrent.futures import ThreadPoolExecutor
+from metrics.track_store import load_track_store, track_counts
+from metrics.dataset_manifest import scan_dataset
+from metrics.file_ids import normalize_file_ids, build_registry, file_codes, take, report_unmatched
+from metrics import profiling
 
 #---------------------------------------------------------------
 
-def load_track_counts(tracks_dir):
+def load_track_counts(tracks_dir, track_store=None, manifest=None):
+    if track_store is not None:
+        return load_store_track_counts(tracks_dir, track_store)
     ditr = []
-    for f in glob(os.path.join(tracks_dir, "*", "*", "*.csv")):
-        dtr = pd.read_csv(f)
-        ditr.append([os.path.basename(f).replace('.csv', '.avi'), len(np.unique(dtr.id))])
+    for entry in scan_dataset([tracks_dir], manifest)[tracks_dir]:
+        # <subset>/<dir>/<file>.csv only
+        if len(entry['relpath'].split(os.sep)) != 3 or not entry['relpath'].endswith('.csv'):
+            continue
+        dtr = pd.read_csv(os.path.join(tracks_dir, entry['relpath']))
+        ditr.append([entry['stem'] + '.avi', len(np.unique(dtr.id))])
     counts = pd.DataFrame(ditr, columns=['file_id', 'count'])
     counts.set_index('file_id', inplace=True)
     return counts
 
 #---------------------------------------------------------------
 
+def load_store_track_counts(tracks_dir, track_store):
+    store = load_track_store(track_store, tracks_dir)
+    n_tracks = track_counts(store)
+    # Same <subset>/<dir>/<file>.csv layout that load_track_counts reads
+    keep = [i for i, meta in enumerate(store['files']) if len(meta['relpath'].split(os.sep)) == 3]
+    counts = pd.DataFrame({
+        'file_id': [store['files'][i]['stem'] + '.avi' for i in keep],
+        'count': n_tracks[keep]
+    })
+    counts.set_index('file_id', inplace=True)
+    return counts
+
+#---------------------------------------------------------------
+
 def load_gt(gt_path):
     gt = pd.read_csv(gt_path, header=None)
     gt.columns = ['file_id', 'gt']
+    gt['file_id'] = normalize_file_ids(gt['file_id'])
     gt.set_index('file_id', inplace=True)
     return gt
 
 #---------------------------------------------------------------
 
-def preprocess_submission(file_path):
-    df = pd.read_csv(file_path)
-    df = df[df['score'] != 0]
-    df = df.drop_duplicates(subset=df.columns[df.columns.isin(['id_submission', 'ts']) == False])
-    df['ts'] = pd.to_datetime(df['ts']) - pd.Timedelta(hours=1)
-    df = df[df['ts'].dt.year != 2025]
-    df['timestamp'] = df['ts'].astype(int) // 10**9
+SUBMISSION_CHUNK_ROWS = 100000
+
+#---------------------------------------------------------------
+
+def submission_chunks(file_path, chunk_rows=SUBMISSION_CHUNK_ROWS):
+    # Leaderboard log read chunk by chunk: submissions with a non-zero score,
+    # the first copy of every row (ignoring id_submission and ts) over the
+    # whole log, tracked as a running set of 64-bit row hashes, then 'ts'
+    # moved back one hour and outside 2025. Every column but score is read as
+    # text, so a row hashes the same whatever the rest of its chunk holds
+    columns = pd.read_csv(file_path, nrows=0).columns
+    dtypes = {column: 'float64' if column == 'score' else 'object' for column in columns}
+    seen = set()
+    for chunk in pd.read_csv(file_path, dtype=dtypes, chunksize=chunk_rows):
+        chunk = chunk[chunk['score'] != 0]
+        columns = chunk.columns[chunk.columns.isin(['id_submission', 'ts']) == False]
+        keep = np.zeros(len(chunk), dtype=bool)
+        for i, row_hash in enumerate(pd.util.hash_pandas_object(chunk[columns], index=False).tolist()):
+            if row_hash not in seen:
+                seen.add(row_hash)
+                keep[i] = True
+        chunk = chunk[keep]
+        chunk = chunk.assign(ts=pd.to_datetime(chunk['ts']) - pd.Timedelta(hours=1))
+        chunk = chunk[chunk['ts'].dt.year != 2025]
+        yield chunk.assign(timestamp=chunk['ts'].astype(int) // 10**9)
+
+#---------------------------------------------------------------
+
+def team_top_k(df, top_k):
+    # The top_k best scores of every team; ties keep the earliest submissions
+    best = df.sort_values('score', ascending=False, kind='stable').groupby('team', sort=False, dropna=False).head(top_k)
+    return best.sort_index()
+
+#---------------------------------------------------------------
+
+def numeric_columns(df):
+    # The text columns that read_csv would have parsed as numbers
+    for column in df.columns[df.dtypes == object]:
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+#---------------------------------------------------------------
+
+def preprocess_submission(file_path, top_k=None, chunk_rows=SUBMISSION_CHUNK_ROWS):
+    # With top_k only each team's top_k submissions are kept while reading,
+    # so memory is bounded by the number of teams instead of submissions
+    frames, empty = [], None
+    for chunk in submission_chunks(file_path, chunk_rows):
+        if not len(chunk):
+            empty = chunk
+            continue
+        frames.append(chunk)
+        if top_k is not None:
+            frames = [team_top_k(pd.concat(frames), top_k)]
+    df = numeric_columns(pd.concat(frames) if frames else empty)
     df = df.sort_values("score", ascending=False)
     return df
 
@@ -39,37 +115,111 @@ def preprocess_submission(file_path):
 def build_file_timestamp_dict(predictions_glob):
     file_names = glob(predictions_glob)
     valid_files = [file for file in file_names if file.endswith('.csv')]
-    return {
+    file_timestamp_dict = {
         int(os.path.basename(file).split('predicted')[1].split('.csv')[0]): file
         for file in valid_files
     }
+    return dict(sorted(file_timestamp_dict.items()))
+
+#---------------------------------------------------------------
+
+def build_timestamp_index(file_timestamp_dict):
+    timestamps = np.fromiter(file_timestamp_dict.keys(), dtype=np.int64, count=len(file_timestamp_dict))
+    files = np.array(list(file_timestamp_dict.values()), dtype=object)
+    order = np.argsort(timestamps, kind='stable')
+    return timestamps[order], files[order]
+
+#---------------------------------------------------------------
+
+def match_timestamps(timestamps, timestamp_index, max_skew=None):
+    # Binary search for the nearest uploaded file; on a tie the earlier file
+    # wins. Submissions further than max_skew seconds from any file get None.
+    index_ts, index_files = timestamp_index
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if len(index_ts) == 0:
+        return np.full(len(timestamps), None, dtype=object), np.full(len(timestamps), np.inf)
+
+    pos = np.searchsorted(index_ts, timestamps, side='left')
+    before = np.clip(pos - 1, 0, len(index_ts) - 1)
+    after = np.clip(pos, 0, len(index_ts) - 1)
+    skew_before = np.abs(timestamps - index_ts[before])
+    skew_after = np.abs(index_ts[after] - timestamps)
+    use_before = (pos > 0) & ((skew_before <= skew_after) | (pos == len(index_ts)))
+    nearest = np.where(use_before, before, after)
+    skew = np.where(use_before, skew_before, skew_after)
+
+    files = index_files[nearest].copy()
+    if max_skew is not None:
+        files[skew > max_skew] = None
+    return files, skew
 
 #---------------------------------------------------------------
 
-def get_nearest_file(timestamp, file_timestamp_dict):
-    closest_timestamp = min(file_timestamp_dict.keys(), key=lambda x: abs(x - timestamp))
-    return file_timestamp_dict[closest_timestamp]
+def get_nearest_file(timestamp, file_timestamp_dict, max_skew=None):
+    timestamp_index = file_timestamp_dict
+    if isinstance(file_timestamp_dict, dict):
+        timestamp_index = build_timestamp_index(file_timestamp_dict)
+    files, _ = match_timestamps([timestamp], timestamp_index, max_skew)
+    return files[0]
 
 #---------------------------------------------------------------
 
-def build_all_data(df, file_timestamp_dict, gt_df):
-    df['file_path'] = df['timestamp'].apply(lambda x: get_nearest_file(x, file_timestamp_dict))
+def load_predictions(file_path):
+    file_data = pd.read_csv(file_path, header=None)
+    predictions = pd.Series(file_data[1].to_numpy(), index=normalize_file_ids(file_data[0]))
+    predictions.index.name = 'file_id'
+    return predictions[~predictions.index.duplicated(keep='last')]
+
+#---------------------------------------------------------------
+
+def match_submissions(df, file_timestamp_dict, max_skew=None):
+    # Best matched submission per team, sorted by leaderboard score
+    with profiling.stage('match_timestamps'):
+        timestamp_index = file_timestamp_dict
+        if isinstance(file_timestamp_dict, dict):
+            timestamp_index = build_timestamp_index(file_timestamp_dict)
+        df['file_path'], _ = match_timestamps(df['timestamp'].to_numpy(), timestamp_index, max_skew)
+
+    unmatched = df['file_path'].isna()
+    if unmatched.any():
+        print(f'No matching prediction file for {unmatched.sum()} submissions (max_skew={max_skew}):')
+        print(df.loc[unmatched, ['team', 'ts', 'score']].to_string(index=False))
+        df = df[~unmatched]
     df = df.sort_values(by=['team', 'score'], ascending=[True, False]).drop_duplicates(subset=['team'], keep='first')
-    df = df.sort_values("score", ascending=False)
+    return df.sort_values("score", ascending=False)
+
+#---------------------------------------------------------------
+
+def cached_predictions(file_path, prediction_cache):
+    # prediction_cache is a dict shared across phases; a file is parsed once
+    if file_path not in prediction_cache:
+        prediction_cache[file_path] = load_predictions(file_path)
+    return prediction_cache[file_path]
+
+#---------------------------------------------------------------
+
+def load_score_matrix(matched_df, gt_df, workers=8, prediction_cache=None):
+    load = load_predictions
+    if prediction_cache is not None:
+        load = lambda file_path: cached_predictions(file_path, prediction_cache)
+    with profiling.stage('load_predictions', files=len(matched_df)):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            predictions = list(executor.map(load, matched_df['file_path']))
+
+    # One row per file ID of the GT or any prediction, in sorted order
+    registry = build_registry(gt_df.index, *[pred.index for pred in predictions])
+    gt_codes = file_codes(gt_df.index, registry)
+    columns = {}
+    for team, pred in zip(matched_df['team'], predictions):
+        codes = file_codes(pred.index, registry)
+        columns[team] = take(pred.to_numpy(), codes)
+        report_unmatched(team, registry[(codes < 0) & (gt_codes >= 0)], 'prediction')
+    for column in gt_df.columns:
+        columns[column] = take(gt_df[column].to_numpy(), gt_codes)
+    report_unmatched('Ground truth', registry[gt_codes < 0], 'label')
+    return pd.DataFrame(columns, index=registry)
+
+#---------------------------------------------------------------
 
-    all_data = pd.DataFrame()
-    for _, row in df.iterrows():
-        file_data = pd.read_csv(row['file_path'], header=None)
-        file_data.columns = ['file_id', row['team']]
-        file_data['file_id'] = file_data['file_id'].apply(
-            lambda x: '_'.join([part.zfill(2) if part.isdigit() else part for part in x.split('_')])
-        )
-
-        if all_data.empty:
-            all_data = file_data[['file_id', row['team']]]
-        else:
-            all_data = pd.merge(all_data, file_data[['file_id', row['team']]], on='file_id', how='outer')
-
-    all_data = pd.merge(all_data, gt_df, on='file_id', how='outer')
-    all_data.set_index('file_id', inplace=True)
-    return all_data
+def build_all_data(df, file_timestamp_dict, gt_df, workers=8, max_skew=None):
+    return load_score_matrix(match_submissions(df, file_timestamp_dict, max_skew), gt_df, workers)
@@ -1,71 +1,318 @@
 import pandas as pd
 import argparse
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib import import_module
+from importlib.metadata import version
 from metrics.upload_files import (
     load_track_counts,
     load_gt,
     preprocess_submission,
     build_file_timestamp_dict,
-    build_all_data
+    build_timestamp_index,
+    match_submissions,
+    load_score_matrix
 )
-from metrics.roc_curves import plot_roc_curves, clean_model_name
 from metrics.overall_metrics import evaluate_models
-from metrics.ncell_curves import plot_score_vs_cells
-from metrics.snr_curves import plot_score_vs_snr
-from metrics.descriptives import plot_class_distribution, plot_metric_distributions
+from metrics.bootstrap import bootstrap_report
+from metrics.delong import delong_pvalues
+from metrics.threshold_sweep import threshold_sweep, best_thresholds
+from metrics.history import evaluate_history, team_progression
+from metrics.stage_cache import (
+    digest,
+    file_digest,
+    files_signature,
+    source_digest,
+    run_stage,
+    cached_files,
+    store_files
+)
+from metrics import profiling
+
+# Modules called by a stage or figure besides the one that implements it
+STRATA_MODULES = ('metrics.strata', 'metrics.overall_metrics', 'metrics.file_ids')
+FIGURE_MODULES = {'metrics.descriptives': ('metrics.file_ids',)}
 
 #---------------------------------------------------------------
 
-def load_analysis(tracks_path, submission_file, gt_file, timestamp_pattern, output_file='./evaluation_metrics.csv'):
+def load_analysis(tracks_path, submission_file, gt_file, timestamp_pattern, output_file='./evaluation_metrics.csv', max_skew=None,
+                  delong_file=None, sweep_file=None, best_threshold_file=None, n_boot=0, seed=0, workers=1, bootstrap_file=None, ranks_file=None,
+                  history_file=None, progression_file=None, chunk_size=256, cache_dir=None, timestamp_index=None,
+                  prediction_cache=None, top_k=None):
+    # Stages ingest -> match -> scores -> metrics; each stage key chains the
+    # keys of its inputs, so with a cache_dir only invalidated stages rerun.
+    # Phases can share one timestamp_index and one prediction_cache.
     #counts = load_track_counts(tracks_path)
     #counts.to_csv('counts.csv', index=True)
-    gt = load_gt(gt_file)
-    submission_df = preprocess_submission(submission_file)
-    file_timestamp_dict = build_file_timestamp_dict(timestamp_pattern)
-    all_data = build_all_data(submission_df, file_timestamp_dict, gt)
+    if timestamp_index is None:
+        timestamp_index = build_timestamp_index(build_file_timestamp_dict(timestamp_pattern))
+    ingest_key = digest('ingest', file_digest(gt_file), file_digest(submission_file), top_k,
+                        source_digest('metrics.upload_files', 'metrics.file_ids'))
+    files_key = files_signature(timestamp_index[1])
+
+    def ingest():
+        with profiling.stage('load_gt'):
+            gt = load_gt(gt_file)
+        with profiling.stage('preprocess_submission'):
+            return gt, preprocess_submission(submission_file, top_k=top_k)
+    gt, submission_df = run_stage(cache_dir, 'ingest', ingest_key, ingest)
+
+    if history_file is not None:
+        history_key = digest('history', ingest_key, files_key, chunk_size, max_skew,
+                             source_digest('metrics.history', 'metrics.overall_metrics', 'metrics.file_ids'))
+        history_df = run_stage(cache_dir, 'history', history_key, lambda: evaluate_history(
+            submission_df, timestamp_index, gt, chunk_size=chunk_size, max_skew=max_skew))
+        history_df.to_csv(history_file, index=False)
+        team_progression(history_df).to_csv(progression_file, index=False)
+
+    match_key = digest('match', ingest_key, files_key, max_skew)
+    matched_df = run_stage(cache_dir, 'match', match_key, lambda: match_submissions(
+        submission_df.copy(), timestamp_index, max_skew))
+    scores_key = digest('scores', match_key, source_digest('metrics.upload_files', 'metrics.file_ids'))
+    all_data = run_stage(cache_dir, 'scores', scores_key,
+                         lambda: load_score_matrix(matched_df, gt, prediction_cache=prediction_cache))
 
-    metrics_df = evaluate_models(all_data)
+    metrics_code = source_digest('metrics.overall_metrics')
+    metrics_df = run_stage(cache_dir, 'metrics', digest('metrics', scores_key, metrics_code),
+                           lambda: evaluate_models(all_data))
     metrics_df.to_csv(output_file, index=False)
     print(metrics_df)
-    return all_data, metrics_df, gt
+
+    if delong_file is not None:
+        delong_df = run_stage(cache_dir, 'delong', digest('delong', scores_key, metrics_code, source_digest('metrics.delong')),
+                              lambda: delong_pvalues(all_data))
+        delong_df.to_csv(delong_file)
+
+    if sweep_file is not None:
+        def sweep_thresholds():
+            sweep = threshold_sweep(all_data)
+            return sweep, best_thresholds(all_data, sweep)
+        sweep_key = digest('sweep', scores_key, metrics_code, source_digest('metrics.threshold_sweep'))
+        sweep, best = run_stage(cache_dir, 'threshold_sweep', sweep_key, sweep_thresholds)
+        sweep.to_csv(sweep_file, index=False)
+        best.to_csv(best_threshold_file, index=False)
+
+    if n_boot > 0:
+        bootstrap_key = digest('bootstrap', scores_key, metrics_code, source_digest('metrics.bootstrap'), n_boot, seed)
+        summary, rank_dist = run_stage(cache_dir, 'bootstrap', bootstrap_key,
+                                       lambda: bootstrap_report(all_data, n_boot=n_boot, seed=seed, workers=workers),
+                                       n_boot=n_boot)
+        summary.to_csv(bootstrap_file, index=False)
+        rank_dist.to_csv(ranks_file)
+        print(summary)
+    return all_data, metrics_df, gt, scores_key
+
+#---------------------------------------------------------------
+
+def load_phases(args):
+    # A manifest lists any number of phases as {"name", "submission", "gt"};
+    # relative paths are taken from the manifest's folder. Without one, the
+    # challenge's Test (2) and Validation (1) phases come from the CLI.
+    if args.manifest is None:
+        return [
+            {'name': '2', 'submission': args.submission2, 'gt': args.gt2},
+            {'name': '1', 'submission': args.submission1, 'gt': args.gt1}
+        ]
+    with open(args.manifest) as f:
+        phases = json.load(f).get('phases', [])
+    if not phases:
+        raise ValueError(f'{args.manifest}: no phases')
+    for k, phase in enumerate(phases):
+        missing = [key for key in ['name', 'submission', 'gt'] if key not in phase]
+        if missing:
+            raise ValueError(f'{args.manifest}: phase {k} has no {", ".join(missing)}')
+    names = [str(phase['name']) for phase in phases]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicates:
+        raise ValueError(f'{args.manifest}: duplicate phase names {", ".join(duplicates)}')
+    root = os.path.dirname(os.path.abspath(args.manifest))
+    return [{'name': str(phase['name']),
+             'submission': os.path.join(root, phase['submission']),
+             'gt': os.path.join(root, phase['gt'])} for phase in phases]
+
+#---------------------------------------------------------------
+
+def run_phase(args, phase, timestamp_index, prediction_cache):
+    name = phase['name']
+    with profiling.stage('phase', phase=name):
+        return load_analysis(
+            tracks_path=args.tracks_path,
+            submission_file=phase['submission'],
+            gt_file=phase['gt'],
+            timestamp_pattern=args.timestamp_pattern,
+            output_file=os.path.join(args.output_path,f'evaluation_metrics{name}.csv'),
+            max_skew=args.max_skew,
+            delong_file=os.path.join(args.output_path,f'delong_pvalues{name}.csv'),
+            sweep_file=os.path.join(args.output_path,f'threshold_sweep{name}.csv'),
+            best_threshold_file=os.path.join(args.output_path,f'best_thresholds{name}.csv'),
+            n_boot=args.bootstrap,
+            seed=args.seed,
+            workers=args.workers,
+            bootstrap_file=os.path.join(args.output_path,f'bootstrap_metrics{name}.csv'),
+            ranks_file=os.path.join(args.output_path,f'bootstrap_ranks{name}.csv'),
+            history_file=os.path.join(args.output_path,f'history_metrics{name}.csv') if args.history else None,
+            progression_file=os.path.join(args.output_path,f'history_progression{name}.csv'),
+            chunk_size=args.chunk_size,
+            cache_dir=args.cache_dir,
+            timestamp_index=timestamp_index,
+            prediction_cache=prediction_cache,
+            top_k=args.top_k
+        )
 
 #---------------------------------------------------------------
 
 def main(args):
+    if args.trace is not None:
+        profiling.enable()
 
-    # Phase 2 - Test
-    all_data_2, _, gt2 = load_analysis(
-        tracks_path=args.tracks_path,
-        submission_file=args.submission2,
-        gt_file=args.gt2,
-        timestamp_pattern=args.timestamp_pattern,
-        output_file=os.path.join(args.output_path,'evaluation_metrics2.csv')
-    )
-    # Quality metrics
-    quality_metric = pd.read_csv(args.quality_csv, index_col='Unnamed: 0', usecols=['SNR', 'Unnamed: 0', 'N.TRACKS'])
-    # Training ground truth
-    gt_train = load_gt(args.gt_train)
-    # Phase 1 - Validation
-    all_data_1, _, gt1 = load_analysis(
-        tracks_path=args.tracks_path,
-        submission_file=args.submission1,
-        gt_file=args.gt1,
-        timestamp_pattern=args.timestamp_pattern,
-        output_file=os.path.join(args.output_path,'evaluation_metrics1.csv')
-    )
-    
-    # Plots - Test
-    style_dict = plot_roc_curves(all_data_2, output_path=os.path.join(args.output_path,'roc2.png'))
-    plot_score_vs_cells(all_data_2, quality_metric.copy(), style_dict, clean_name_fn=clean_model_name,
-                        output_path=os.path.join(args.output_path,'ncell.png'))
-    plot_score_vs_snr(all_data_2, quality_metric.copy(), style_dict, clean_name_fn=clean_model_name,
-                      output_path=os.path.join(args.output_path,'snr.png'))
-    # Plots - Validation
-    plot_roc_curves(all_data_1, style_dict=style_dict, output_path=os.path.join(args.output_path,'roc1.png'))
-
-    # Plots general descriptives
-    plot_class_distribution(quality_metric.copy(), gt1, gt2, gt_train, output_path=os.path.join(args.output_path,'class.png'))
-    plot_metric_distributions(quality_metric.copy(), gt1, gt2, output_path=os.path.join(args.output_path,'metric.png'))
+    phases = load_phases(args)
+    # One glob of the prediction archive and one parse of each file for all phases
+    with profiling.stage('build_file_timestamp_dict'):
+        timestamp_index = build_timestamp_index(build_file_timestamp_dict(args.timestamp_pattern))
+    prediction_cache = {}
+
+    with ThreadPoolExecutor(max_workers=args.phase_workers or len(phases)) as executor:
+        results = list(executor.map(lambda phase: run_phase(args, phase, timestamp_index, prediction_cache), phases))
+    results = [(phase['name'], *result) for phase, result in zip(phases, results)]
+
+    summary = pd.concat([metrics_df.assign(Phase=name) for name, _, metrics_df, _, _ in results], ignore_index=True)
+    summary = summary[['Phase'] + [c for c in summary.columns if c != 'Phase']]
+    summary.to_csv(os.path.join(args.output_path, 'summary.csv'), index=False)
+    print(summary.pivot(index='Model', columns='Phase', values='Score')[[name for name, *_ in results]])
+
+    def load_quality():
+        # Quality metrics
+        quality_metric = pd.read_csv(args.quality_csv, index_col='Unnamed: 0', usecols=['SNR', 'Unnamed: 0', 'N.TRACKS'])
+        # Training ground truth
+        return quality_metric, load_gt(args.gt_train)
+    quality_key = digest('quality', file_digest(args.quality_csv), file_digest(args.gt_train),
+                         source_digest('metrics.upload_files', 'metrics.file_ids'))
+    quality_metric, gt_train = run_stage(args.cache_dir, 'quality', quality_key, load_quality)
+
+    if not args.no_plots:
+        with profiling.stage('plots', workers=args.plot_workers):
+            plot_figures(args, results, quality_metric, gt_train,
+                         digest([scores_key for *_, scores_key in results], quality_key))
+
+    if args.trace is not None:
+        profiling.write_trace(args.trace)
+
+#---------------------------------------------------------------
+
+def plot_figures(args, results, quality_metric, gt_train, data_key):
+    headless = args.headless or args.plot_workers > 1
+    if headless:
+        # Non-interactive backend for this process and the render workers
+        os.environ['MPLBACKEND'] = 'Agg'
+    # Score-vs-cells and score-vs-SNR curves are drawn for the first phase
+    all_data = results[0][1]
+    from metrics.ncell_curves import compute_score_per_cell_count
+    from metrics.snr_curves import compute_score_by_snr
+    ncell_df = run_stage(args.cache_dir, 'strata_ncell',
+                         digest('ncell', data_key, source_digest('metrics.ncell_curves', *STRATA_MODULES)),
+                         lambda: compute_score_per_cell_count(all_data, quality_metric))
+    snr_strata = run_stage(args.cache_dir, 'strata_snr',
+                           digest('snr', data_key, source_digest('metrics.snr_curves', *STRATA_MODULES)),
+                           lambda: compute_score_by_snr(all_data, quality_metric))
+
+    # Figure groups whose inputs and plotting code are unchanged are copied from the cache
+    groups = []
+    for group in plot_groups(results, quality_metric, gt_train, args.output_path, ncell_df, snr_strata,
+                             args.descriptive_phases):
+        key = figure_key(group, data_key)
+        output_paths = [plot_kwargs['output_path'] for _, _, _, plot_kwargs in group]
+        if args.cache_dir is None or not cached_files(args.cache_dir, key, output_paths):
+            groups.append((group, key, output_paths))
+
+    show = not headless
+    trace = profiling.is_enabled()
+    if args.plot_workers > 1:
+        with ProcessPoolExecutor(max_workers=args.plot_workers) as executor:
+            events = list(executor.map(render_plots, [group for group, _, _ in groups],
+                                       [show] * len(groups), [trace] * len(groups)))
+    else:
+        events = [render_plots(group, show, trace) for group, _, _ in groups]
+    for group_events in events:
+        profiling.extend(group_events)
+
+    if args.cache_dir is not None:
+        for _, key, output_paths in groups:
+            store_files(args.cache_dir, key, output_paths)
+
+#---------------------------------------------------------------
+
+def figure_key(group, data_key):
+    # Every plot input derives from the stages behind data_key; add the source
+    # of each module that draws the group
+    modules = set()
+    functions = []
+    for module_name, function_name, _, plot_kwargs in group:
+        modules.add(module_name)
+        modules.update(FIGURE_MODULES.get(module_name, ()))
+        modules.update(v.__module__ for v in plot_kwargs.values() if callable(v))
+        functions.append((module_name, function_name, os.path.basename(plot_kwargs['output_path'])))
+    return digest('figures', data_key, functions, source_digest(*sorted(modules)),
+                  version('matplotlib'), version('seaborn'))
+
+#---------------------------------------------------------------
+
+def plot_groups(results, quality_metric, gt_train, output_path, ncell_df=None, snr_strata=None,
+                descriptive_phases=('1', '2')):
+    # Figures that can be drawn independently: one ROC curve per phase, the
+    # strata curves of the first phase and, with the validation and test
+    # phases of descriptive_phases, the dataset descriptives. The styles of every model are fixed up
+    # front, in phase order; class and metric share one group because
+    # plot_class_distribution changes the global rcParams the metric plot uses.
+    from metrics.roc_curves import roc_style_dict, clean_model_name
+    style_dicts = []
+    for _, all_data, _, _, _ in results:
+        style_dicts.append(roc_style_dict(all_data, dict(style_dicts[-1]) if style_dicts else None))
+    name, all_data, _, _, _ = results[0]
+
+    roc_groups = [
+        [('metrics.roc_curves', 'plot_roc_curves', (phase_data,),
+          {'style_dict': style_dict, 'output_path': os.path.join(output_path, f'roc{phase_name}.png')})]
+        for (phase_name, phase_data, _, _, _), style_dict in zip(results, style_dicts)
+    ]
+    groups = [
+        roc_groups[0],
+        [('metrics.ncell_curves', 'plot_score_vs_cells', (all_data, quality_metric.copy(), style_dicts[0]),
+          {'clean_name_fn': clean_model_name, 'metrics_df': ncell_df, 'output_path': os.path.join(output_path, 'ncell.png')})],
+        [('metrics.snr_curves', 'plot_score_vs_snr', (all_data, quality_metric.copy(), style_dicts[0]),
+          {'clean_name_fn': clean_model_name, 'strata': snr_strata, 'output_path': os.path.join(output_path, 'snr.png')})],
+        *roc_groups[1:]
+    ]
+
+    gts = {phase_name: gt for phase_name, _, _, gt, _ in results}
+    validation, test = descriptive_phases
+    if validation in gts and test in gts:
+        # Plots general descriptives
+        groups.append(
+            [('metrics.descriptives', 'plot_class_distribution', (quality_metric.copy(), gts[validation], gts[test], gt_train),
+              {'output_path': os.path.join(output_path, 'class.png')}),
+             ('metrics.descriptives', 'plot_metric_distributions', (quality_metric.copy(), gts[validation], gts[test]),
+              {'output_path': os.path.join(output_path, 'metric.png')})])
+    else:
+        print(f'No phases {validation} and {test} (see --descriptive_phases): class.png and metric.png are skipped.')
+    return groups
+
+#---------------------------------------------------------------
+
+def render_plots(group, show=True, trace=False):
+    # Plot modules are imported here so data-only runs never load matplotlib.
+    # Returns the profiling events of the group for the parent process.
+    if trace:
+        profiling.enable()
+    since = profiling.mark()
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+    with matplotlib.rc_context():
+        for module_name, function_name, plot_args, plot_kwargs in group:
+            with profiling.stage('plot', figure=os.path.basename(plot_kwargs['output_path'])):
+                getattr(import_module(module_name), function_name)(*plot_args, show=show, **plot_kwargs)
+    return profiling.pop_events(since)
 
 #---------------------------------------------------------------
 
@@ -73,15 +320,34 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate challenge submission")
     
     parser.add_argument('--tracks_path', required=True, help='Path to the tracks folder')
-    parser.add_argument('--submission1', required=True, help='Submission file for Phase 1')
-    parser.add_argument('--gt1', required=True, help='Ground truth CSV for Phase 1')
-    parser.add_argument('--submission2', required=True, help='Submission file for Phase 2')
-    parser.add_argument('--gt2', required=True, help='Ground truth CSV for Phase 2')
+    parser.add_argument('--submission1', help='Submission file for Phase 1')
+    parser.add_argument('--gt1', help='Ground truth CSV for Phase 1')
+    parser.add_argument('--submission2', help='Submission file for Phase 2')
+    parser.add_argument('--gt2', help='Ground truth CSV for Phase 2')
+    parser.add_argument('--manifest', help='JSON manifest of the phases to evaluate, instead of --submission1/--gt1/--submission2/--gt2')
+    parser.add_argument('--descriptive_phases', nargs=2, default=['1', '2'], metavar=('VALIDATION', 'TEST'), help='Names of the validation and test phases drawn in class.png and metric.png (default: 1 2)')
+    parser.add_argument('--phase_workers', type=int, default=None, help='Number of phases evaluated concurrently (default: all)')
     parser.add_argument('--timestamp_pattern', required=True, help='Pattern for predicted file timestamps (e.g., "/uploaded_files/predicted1*")')
     parser.add_argument('--quality_csv', required=True, help='Path to quality_overall.csv')
     parser.add_argument('--gt_train', required=True, help='Training ground truth file')
     parser.add_argument('--output_path', required=True, help='Optional output folder path')
+    parser.add_argument('--max_skew', type=int, default=None, help='Maximum seconds between a submission and its prediction file (default: no limit)')
+    parser.add_argument('--history', action='store_true', help='Also score every submission in the leaderboard log, not only each team\'s best')
+    parser.add_argument('--chunk_size', type=int, default=256, help='Submissions scored per chunk in --history mode (default: 256)')
+    parser.add_argument('--top_k', type=int, default=None, help='Only keep the k best-scored submissions of each team while reading the leaderboard log (default: all)')
+    parser.add_argument('--bootstrap', type=int, default=0, help='Number of bootstrap resamples for score CIs and rank stability (default: 0, disabled)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the bootstrap (default: 0)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes for the bootstrap (default: 1)')
+    parser.add_argument('--headless', action='store_true', help='Render the figures with the Agg backend without showing them')
+    parser.add_argument('--plot_workers', type=int, default=1, help='Render independent figures in this many processes; implies --headless (default: 1)')
+    parser.add_argument('--no_plots', action='store_true', help='Only write the metric CSVs, without importing matplotlib')
+    parser.add_argument('--cache_dir', default=None, help='Directory of the stage cache; only stages whose inputs, parameters or code changed are rerun (default: no cache)')
+    parser.add_argument('--trace', default=None, help='Write a JSON trace with the timings and memory of every stage to this file')
 
     args = parser.parse_args()
+    if args.manifest is None and None in (args.submission1, args.gt1, args.submission2, args.gt2):
+        parser.error('either --manifest or all of --submission1, --gt1, --submission2 and --gt2 are required')
+    if args.top_k is not None and args.history:
+        parser.error('--history scores every submission and cannot be combined with --top_k')
     main(args)
 
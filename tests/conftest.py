@@ -0,0 +1,47 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#---------------------------------------------------------------
+
+@pytest.fixture(scope='session')
+def synthetic_dataset(tmp_path_factory):
+    # Small synthetic dataset (see benchmarks/synthetic_data.py) plus a
+    # quality CSV with random SNR and track counts for every video
+    from benchmarks.synthetic_data import generate_dataset
+    root = str(tmp_path_factory.mktemp('synthetic'))
+    paths = generate_dataset(root, videos=24, width=32, height=32, frames=8, cells=3, teams=3, submissions=3)
+    file_ids = pd.concat([pd.read_csv(paths[key], header=None)[0] for key in ['gt_train', 'gt1', 'gt2']])
+    rng = np.random.default_rng(0)
+    quality = pd.DataFrame({
+        'SNR': rng.uniform(1, 20, len(file_ids)),
+        'CR': 1.0,
+        'N.TRACKS': rng.integers(0, 4, len(file_ids)).astype(float)
+    }, index=file_ids.to_numpy())
+    paths['quality_csv'] = os.path.join(root, 'quality.csv')
+    quality.to_csv(paths['quality_csv'])
+    return paths
+
+#---------------------------------------------------------------
+
+@pytest.fixture
+def analysis_args(synthetic_dataset, tmp_path):
+    # run_analysis.main arguments for the synthetic dataset, with the CLI
+    # defaults and headless plots
+    def make(**overrides):
+        args = dict(
+            tracks_path=synthetic_dataset['tracks'], manifest=None, descriptive_phases=['1', '2'],
+            phase_workers=None, submission1=synthetic_dataset['submission1'], gt1=synthetic_dataset['gt1'],
+            submission2=synthetic_dataset['submission2'], gt2=synthetic_dataset['gt2'],
+            timestamp_pattern=synthetic_dataset['timestamp_pattern'], quality_csv=synthetic_dataset['quality_csv'],
+            gt_train=synthetic_dataset['gt_train'], output_path=str(tmp_path), max_skew=None, history=False,
+            chunk_size=256, top_k=None, bootstrap=0, seed=0, workers=1, headless=True, plot_workers=1,
+            no_plots=False, cache_dir=None, trace=None)
+        args.update(overrides)
+        return argparse.Namespace(**args)
+    return make
@@ -0,0 +1,8 @@
+<?php
+// Prints calculate_metrics() of eval_code.php as JSON:
+//   php eval_code_json.php GT.csv PREDICTIONS.csv
+ini_set('display_errors', 'stderr');
+ob_start();
+@include __DIR__ . '/../../../eval_code.php';
+ob_end_clean();
+echo json_encode(calculate_metrics(parse_csv($argv[1]), parse_csv($argv[2]))), "\n";
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from metrics import bootstrap
+from metrics.bootstrap import bootstrap_scores, bootstrap_report
+
+#---------------------------------------------------------------
+
+def leaderboard(seed=0, n_files=60, n_models=4):
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n_files) < 0.3).astype(int)
+    scores = np.round(rng.random((n_files, n_models)) * 0.7 + y[:, None] * 0.3, 2)
+    all_data = pd.DataFrame(scores, columns=[f'Team {k}' for k in range(n_models)])
+    all_data['gt'] = y
+    return all_data
+
+#---------------------------------------------------------------
+
+def test_workers_give_the_same_results():
+    all_data = leaderboard()
+    serial = bootstrap_report(all_data, n_boot=300, seed=3, batch_size=70, workers=1)
+    parallel = bootstrap_report(all_data, n_boot=300, seed=3, batch_size=70, workers=3)
+    for a, b in zip(serial, parallel):
+        assert_frame_equal(a, b)
+
+#---------------------------------------------------------------
+
+def test_every_replicate_is_class_stratified(monkeypatch):
+    all_data = leaderboard()
+    all_data.loc[:4, 'gt'] = np.nan
+    y_true = all_data['gt'].dropna().to_numpy()
+    labels = []
+
+    def rank_auc(s, y):
+        labels.append(y)
+        return np.zeros((y.shape[1], s.shape[2]))
+    monkeypatch.setattr(bootstrap, 'rank_auc', rank_auc)
+
+    auc_boot, _, _ = bootstrap_scores(all_data, n_boot=300, batch_size=70)
+    assert len(auc_boot) == 300
+    y = np.concatenate(labels, axis=1)
+    assert y.shape == (len(y_true), 300)
+    assert (y.sum(axis=0) == y_true.sum()).all()
+    assert ((y == 0).sum(axis=0) == (y_true == 0).sum()).all()
@@ -0,0 +1,22 @@
+import os
+from metrics.compute_quality_metrics import cache_key
+
+#---------------------------------------------------------------
+
+def test_cache_key_reads_only_changed_files(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    fn_avi, file = str(tmp_path / 'a.avi'), str(tmp_path / 'a.csv')
+    for path in (fn_avi, file):
+        with open(path, 'wb') as f:
+            f.write(b'0' * 64)
+        os.utime(path, ns=(10**18, 10**18))
+    key = cache_key(fn_avi, file, cache_dir)
+
+    # Same size and mtime: the sidecar digest is used, not the new contents
+    with open(file, 'wb') as f:
+        f.write(b'1' * 64)
+    os.utime(file, ns=(10**18, 10**18))
+    assert cache_key(fn_avi, file, cache_dir) == key
+
+    os.utime(file, ns=(10**18 + 1, 10**18 + 1))
+    assert cache_key(fn_avi, file, cache_dir) != key
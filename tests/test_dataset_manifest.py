@@ -0,0 +1,62 @@
+import os
+import struct
+from metrics import dataset_manifest
+from metrics.dataset_manifest import scan_dataset
+
+#---------------------------------------------------------------
+
+def write_avi(path, width, height, frames):
+    # RIFF header with just the avih fields read by avi_header
+    avih = struct.pack('<10I', 0, 0, 0, 0, frames, 0, 0, 0, width, height)
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 0) + b'AVI LIST' + struct.pack('<I', 0) + b'hdrl'
+                + b'avih' + struct.pack('<I', 56) + avih + bytes(16))
+
+#---------------------------------------------------------------
+
+def test_file_rewritten_in_place_is_refreshed(tmp_path):
+    root = str(tmp_path / 'dataset')
+    folder = os.path.join(root, 'training', '1')
+    os.makedirs(folder)
+    video = os.path.join(folder, 'a.avi')
+    write_avi(video, 64, 48, 10)
+    # Folders older than the racy window are reused on the next scan
+    for path in (folder, os.path.dirname(folder), root):
+        os.utime(path, ns=(10**18, 10**18))
+    manifest = str(tmp_path / 'manifest.json')
+
+    entry, = scan_dataset([root], manifest)[root]
+    assert (entry['W'], entry['H'], entry['T']) == (64, 48, 10)
+
+    write_avi(video, 128, 96, 25)
+    os.utime(video, ns=(10**18 + 10**9, 10**18 + 10**9))
+    os.utime(folder, ns=(10**18, 10**18))
+    entry, = scan_dataset([root], manifest)[root]
+    assert (entry['W'], entry['H'], entry['T']) == (128, 96, 25)
+    assert entry['mtime_ns'] == 10**18 + 10**9
+
+#---------------------------------------------------------------
+
+def test_headers_read_only_for_a_manifest(tmp_path, monkeypatch):
+    root = str(tmp_path / 'dataset')
+    folder = os.path.join(root, 'training', '0')
+    os.makedirs(folder)
+    write_avi(os.path.join(folder, 'a.avi'), 64, 48, 10)
+
+    opened = []
+    real_header = dataset_manifest.avi_header
+    monkeypatch.setattr(dataset_manifest, 'avi_header', lambda path: opened.append(path) or real_header(path))
+
+    entry, = scan_dataset([root])[root]
+    assert (entry['W'], entry['H'], entry['T']) == (None, None, None)
+    assert opened == []
+
+    entry, = scan_dataset([root], headers=True)[root]
+    assert (entry['W'], entry['H'], entry['T']) == (64, 48, 10)
+
+    # A manifest saved without headers gets them once they are asked for
+    manifest = str(tmp_path / 'manifest.json')
+    entry, = scan_dataset([root], manifest, headers=False)[root]
+    assert entry['W'] is None
+    entry, = scan_dataset([root], manifest)[root]
+    assert (entry['W'], entry['H'], entry['T']) == (64, 48, 10)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+from metrics.delong import delong_pvalues
+
+#---------------------------------------------------------------
+
+def delong_pvalue_pair(a, b, y):
+    # Brute-force paired DeLong test of two models from the O(m*n) kernel
+    # matrices psi(pos_i, neg_j) = 1, 1/2 or 0
+    def components(s):
+        pos, neg = s[y == 1], s[y == 0]
+        psi = (pos[:, None] > neg[None, :]) + 0.5 * (pos[:, None] == neg[None, :])
+        return psi.mean(), psi.mean(axis=1), psi.mean(axis=0)
+    auc_a, v10_a, v01_a = components(a)
+    auc_b, v10_b, v01_b = components(b)
+    m, n = len(v10_a), len(v01_a)
+    s10 = np.cov(v10_a, v10_b)
+    s01 = np.cov(v01_a, v01_b)
+    var = (s10[0, 0] + s10[1, 1] - 2 * s10[0, 1]) / m + (s01[0, 0] + s01[1, 1] - 2 * s01[0, 1]) / n
+    if var <= 0:
+        return 1.0
+    return 2 * norm.sf(abs(auc_a - auc_b) / np.sqrt(var))
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('seed', range(5))
+def test_delong_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n_files, n_models = int(rng.integers(10, 80)), int(rng.integers(2, 6))
+    y = rng.integers(0, 2, n_files).astype(float)
+    y[:2] = [0, 1]
+    # Coarse scores give ties; a missing label or score drops the file
+    scores = np.round(rng.random((n_files, n_models)) * 0.6 + y[:, None] * rng.random(n_models) * 0.4, 1)
+    y[2] = np.nan
+    scores[3, 0] = np.nan
+    all_data = pd.DataFrame(scores, columns=[f'Team {k}' for k in range(n_models)])
+    all_data['gt'] = y
+
+    pvalues = delong_pvalues(all_data)
+    keep = ~np.isnan(y) & ~np.isnan(scores).any(axis=1)
+    for i in range(n_models):
+        for j in range(n_models):
+            expected = delong_pvalue_pair(scores[keep, i], scores[keep, j], y[keep])
+            assert pvalues.iloc[i, j] == pytest.approx(expected, rel=1e-9, abs=1e-12)
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pandas as pd
+from metrics.upload_files import load_gt, load_predictions
+from metrics.overall_metrics import evaluate_models
+from metrics.history import evaluate_history, team_progression
+
+#---------------------------------------------------------------
+
+def write_archive(tmp_path, rng, n_gt=40, n_files=9):
+    file_ids = [f'{i // 10 + 1}_{i % 10}.avi' for i in range(n_gt)]
+    y = rng.integers(0, 2, n_gt)
+    y[:2] = [0, 1]
+    gt_path = str(tmp_path / 'gt.csv')
+    pd.DataFrame({'file_id': file_ids, 'gt': y}).to_csv(gt_path, header=False, index=False)
+
+    files = {}
+    for k in range(n_files):
+        # Each file predicts a random subset of the GT files plus an unknown ID
+        keep = rng.random(n_gt) < 0.85
+        scores = np.round(rng.random(n_gt) * 0.6 + y * rng.random() * 0.4, 2)
+        pred = pd.DataFrame({'file_id': np.array(file_ids)[keep], 'score': scores[keep]})
+        pred.loc[len(pred)] = ['99_9.avi', 0.5]
+        timestamp = 1730851200 + 3600 * k
+        path = str(tmp_path / f'predicted{timestamp}.csv')
+        pred.to_csv(path, header=False, index=False)
+        files[timestamp] = path
+    return gt_path, files
+
+#---------------------------------------------------------------
+
+def test_history_matches_evaluate_models(tmp_path):
+    rng = np.random.default_rng(0)
+    gt_path, files = write_archive(tmp_path, rng)
+    gt = load_gt(gt_path)
+    timestamps = rng.choice(list(files), 25)
+    submission_df = pd.DataFrame({
+        'team': rng.choice(['A', 'B', 'C'], len(timestamps)),
+        'score': rng.random(len(timestamps)),
+        'ts': pd.to_datetime(timestamps, unit='s'),
+        'timestamp': timestamps
+    })
+
+    history = evaluate_history(submission_df, files, gt, chunk_size=4, workers=2)
+    assert len(history) == len(submission_df)
+    assert (history['ts'].to_numpy() == submission_df.sort_values('timestamp', kind='stable')['ts'].to_numpy()).all()
+    for _, row in history.iterrows():
+        predictions = load_predictions(row['file_path'])
+        all_data = pd.DataFrame({'model': predictions.reindex(gt.index).to_numpy(), 'gt': gt['gt'].to_numpy()})
+        expected = evaluate_models(all_data).iloc[0]
+        for column in ['AUC', 'Precision', 'Recall', 'Balanced Accuracy', 'Score']:
+            assert row[column] == expected[column], column
+        assert row['Missing'] == (~gt.index.isin(predictions.index)).sum()
+
+    progression = team_progression(history)
+    for team, rows in progression.groupby('team'):
+        assert (rows['Submission'].to_numpy() == np.arange(1, len(rows) + 1)).all()
+        assert (rows['Best Score'].to_numpy() == np.maximum.accumulate(rows['Score'].to_numpy())).all()
+        assert rows['ts'].is_monotonic_increasing
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from metrics.kinematics import video_kinematics
+
+#---------------------------------------------------------------
+
+def make_store(spots, stems):
+    # spots: rows of (file, id, x, y, t)
+    spots = np.asarray(spots, dtype=float).reshape(-1, 5)
+    store = {column: spots[:, k] for k, column in enumerate(['file', 'id', 'x', 'y', 't'])}
+    store['file'] = store['file'].astype(np.int32)
+    store['files'] = [{'stem': stem} for stem in stems]
+    return store
+
+#---------------------------------------------------------------
+
+def test_single_track_by_hand():
+    # Steps (3, 4), (0, 6), (6, 0), one frame apart; rows out of time order
+    store = make_store([(0, 7, 3, 10, 2), (0, 7, 0, 0, 0), (0, 7, 9, 10, 3), (0, 7, 3, 4, 1)], ['01_1'])
+    video_df, tracks_df = video_kinematics(store)
+    track = tracks_df.iloc[0]
+    assert track['file_id'] == '01_1.avi' and track['N.SPOTS'] == 4
+    assert track['SPEED avg'] == pytest.approx(17 / 3)
+    assert track['SPEED max'] == pytest.approx(6)
+    # atan2(18, 24) between the first two steps, a right angle between the last two
+    assert track['TURN avg'] == pytest.approx((np.degrees(np.arctan(0.75)) + 90) / 2)
+    assert track['TURN max'] == pytest.approx(90)
+    assert track['STRAIGHTNESS'] == pytest.approx(np.sqrt(181) / 17)
+    # Mean squared displacement 97/3, 181/2 and 181 at lags 1, 2 and 3
+    lx, ly = np.log([1, 2, 3]), np.log([97 / 3, 181 / 2, 181])
+    slope = np.sum((lx - lx.mean()) * (ly - ly.mean())) / np.sum((lx - lx.mean()) ** 2)
+    assert track['MSD slope'] == pytest.approx(slope)
+
+    video = video_df.loc['01_1.avi']
+    assert video['SPEED avg'] == pytest.approx(17 / 3)
+    assert video['STRAIGHT avg'] == pytest.approx(np.sqrt(181) / 17)
+    assert video['MSD slope'] == pytest.approx(slope)
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('stems', [[], ['01_1']])
+def test_empty_store(stems):
+    video_df, tracks_df = video_kinematics(make_store([], stems))
+    assert len(tracks_df) == 0
+    assert list(video_df.index) == [stem + '.avi' for stem in stems]
+    assert video_df.isna().all().all()
@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import subprocess
+import numpy as np
+import pytest
+from metrics.live_scorer import (
+    METRIC_KEYS,
+    php_float_string,
+    php_ge,
+    parse_csv,
+    load_ground_truth,
+    calculate_metrics,
+    calculate_metrics_reference,
+    settled_files,
+    score_files
+)
+
+# Metrics of eval_code.php on the fixtures. The expected values follow PHP 8
+# comparison rules and are checked against `php eval_code_json.php GT
+# PREDICTIONS`, which prints calculate_metrics(); that check only skips when
+# php is missing and CBVCC_REQUIRE_PHP is unset.
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'live_scorer')
+
+with open(os.path.join(FIXTURES, 'expected.json')) as f:
+    EXPECTED = json.load(f)
+
+#---------------------------------------------------------------
+
+def fixture_paths(case):
+    return os.path.join(FIXTURES, EXPECTED[case]['gt']), os.path.join(FIXTURES, EXPECTED[case]['predictions'])
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('case', sorted(EXPECTED))
+def test_calculate_metrics_matches_php(case):
+    gt_file, predictions_file = fixture_paths(case)
+    predictions = parse_csv(predictions_file)
+    metrics, _ = calculate_metrics(load_ground_truth(gt_file), predictions)
+    reference = calculate_metrics_reference(parse_csv(gt_file), predictions)
+    for key in METRIC_KEYS:
+        assert metrics[key] == EXPECTED[case]['metrics'][key], key
+        assert reference[key] == EXPECTED[case]['metrics'][key], key
+
+#---------------------------------------------------------------
+
+def test_text_thresholds_compare_as_php_strings():
+    for value, text in [(0.1, '0.1'), (1.0, '1'), (1 / 3, '0.33333333333333'), (0.0001, '0.0001'),
+                        (1e-5, '1.0E-5'), (2.5e-7, '2.5E-7'), (1e14, '1.0E+14'), (-0.0, '-0')]:
+        assert php_float_string(value) == text
+    assert php_ge(0.9, '0.6x') and php_ge(0.7, '0.6x')
+    assert not php_ge(0.65, '0.6x') and not php_ge(0.6, '0.6x')
+    assert php_ge(0.6, ' 0.6 ') and not php_ge(0.59, '0.6')
+    assert php_ge(-1.0, None) and php_ge(0.0, '')
+
+#---------------------------------------------------------------
+
+def test_text_without_consistent_order_is_rejected():
+    # '5abc' sorts below '6' and above '10' byte-wise, while '6' < '10'
+    ids, labels = ['a', 'b', 'c'], np.array([True, False, True])
+    with pytest.raises(ValueError):
+        calculate_metrics((ids, labels), {'a': '6', 'b': '10', 'c': '5abc'})
+    with pytest.raises(ValueError):
+        calculate_metrics_reference({'a': '1', 'b': '0', 'c': '1'}, {'a': '6', 'b': '10', 'c': '5abc'})
+
+#---------------------------------------------------------------
+
+def php_binary():
+    # CI sets CBVCC_REQUIRE_PHP so that the parity check cannot be skipped
+    php = shutil.which('php')
+    if php is None:
+        if os.environ.get('CBVCC_REQUIRE_PHP'):
+            pytest.fail('php is not installed but CBVCC_REQUIRE_PHP is set')
+        pytest.skip('php is not installed')
+    return php
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('case', sorted(EXPECTED))
+def test_expected_metrics_match_eval_code(case):
+    gt_file, predictions_file = fixture_paths(case)
+    output = subprocess.run([php_binary(), os.path.join(FIXTURES, 'eval_code_json.php'), gt_file, predictions_file],
+                            capture_output=True, text=True, check=True).stdout
+    php_metrics = json.loads(output)
+    for key in METRIC_KEYS:
+        assert php_metrics[key] == EXPECTED[case]['metrics'][key], key
+
+#---------------------------------------------------------------
+
+def test_watch_scores_an_upload_once_it_settles(tmp_path):
+    gt_file, _ = fixture_paths('ties')
+    gt = load_ground_truth(gt_file)
+    upload = str(tmp_path / 'predicted1730851200.csv')
+    leaderboard = str(tmp_path / 'leaderboard.csv')
+    scored, signatures = set(), {}
+
+    # First poll: a partial upload is only recorded
+    with open(upload, 'w') as f:
+        f.write('a,0.9\n')
+    files, signatures = settled_files([upload], signatures, scored)
+    assert files == []
+
+    # The upload grows: still not settled
+    with open(upload, 'a') as f:
+        f.write('b,0.1\nc,0.8\n')
+    files, signatures = settled_files([upload], signatures, scored)
+    assert files == []
+
+    # Unchanged since the last poll: scored from the complete file, once
+    files, signatures = settled_files([upload], signatures, scored)
+    assert files == [upload]
+    rows = score_files(files, gt, leaderboard, scored)
+    assert rows[0]['Missing'] == 2
+    files, signatures = settled_files([upload], signatures, scored)
+    assert files == []
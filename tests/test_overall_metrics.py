@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import (
+    roc_auc_score,
+    precision_score,
+    recall_score,
+    balanced_accuracy_score,
+    confusion_matrix
+)
+from metrics.overall_metrics import evaluate_models
+
+#---------------------------------------------------------------
+
+def evaluate_models_loop(all_data, threshold=0.5):
+    # Per-model sklearn loop evaluate_models replaced; results must not move
+    rows = []
+    for column in all_data.columns:
+        if column == 'gt':
+            continue
+        predictions = (all_data[column] >= threshold).astype(int)
+        y_true = all_data['gt']
+        auc_val = roc_auc_score(y_true, all_data[column])
+        precision = precision_score(y_true, predictions, zero_division=0)
+        recall = recall_score(y_true, predictions, zero_division=0)
+        balanced_acc = balanced_accuracy_score(y_true, predictions)
+        tn, fp, fn, tp = confusion_matrix(y_true, predictions).ravel()
+        score = 0.4 * auc_val + 0.2 * (precision + recall + balanced_acc)
+        rows.append([column, round(auc_val, 3), round(precision, 3), round(recall, 3), round(balanced_acc, 3),
+                     round(score, 3), tp, tn, fp, fn])
+    metrics_df = pd.DataFrame(rows, columns=['Model', 'AUC', 'Precision', 'Recall', 'Balanced Accuracy', 'Score',
+                                             'True Positive', 'True Negative', 'False Positive', 'False Negative'])
+    return metrics_df.sort_values(by='Score', ascending=False)
+
+#---------------------------------------------------------------
+
+def random_leaderboard(rng):
+    n_files = int(rng.integers(8, 120))
+    n_models = int(rng.integers(1, 9))
+    y = rng.integers(0, 2, n_files)
+    y[:2] = [0, 1]
+    # Coarse scores give ties and exact-half metrics
+    decimals = int(rng.integers(1, 4))
+    scores = np.round(rng.random((n_files, n_models)) * 0.6 + y[:, None] * rng.random(n_models) * 0.4, decimals)
+    all_data = pd.DataFrame(scores, columns=[f'Team {k}' for k in range(n_models)])
+    all_data['gt'] = y
+    return all_data
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('seed', range(4))
+def test_evaluate_models_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(100):
+        all_data = random_leaderboard(rng)
+        pd.testing.assert_frame_equal(evaluate_models(all_data), evaluate_models_loop(all_data), check_dtype=False)
+
+#---------------------------------------------------------------
+
+def test_exact_half_rounds_like_numpy():
+    # Precision 37/80 = 0.4625 is stored just below the half: 0.462
+    y = np.array([1] * 37 + [0] * 43 + [1] * 10)
+    scores = np.array([0.9] * 80 + [0.1] * 10)
+    all_data = pd.DataFrame({'Team': scores, 'gt': y})
+    assert evaluate_models(all_data)['Precision'].iloc[0] == evaluate_models_loop(all_data)['Precision'].iloc[0] == 0.462
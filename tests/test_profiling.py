@@ -0,0 +1,38 @@
+import os
+import numpy as np
+import pytest
+from metrics import profiling
+
+#---------------------------------------------------------------
+
+@pytest.fixture
+def recording():
+    profiling.enable()
+    yield
+    profiling.disable()
+
+#---------------------------------------------------------------
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='/proc is not available')
+def test_rss_delta_is_per_stage(recording):
+    since = profiling.mark()
+    with profiling.stage('large'):
+        values = np.ones(2**25)
+        values += 1
+    del values
+    with profiling.stage('small'):
+        np.ones(16)
+    large, small = profiling.pop_events(since)
+    assert large['rss_delta_mb'] > 200
+    assert abs(small['rss_delta_mb']) < 50
+
+#---------------------------------------------------------------
+
+def test_disable_stops_recording(recording):
+    with profiling.stage('recorded'):
+        pass
+    profiling.disable()
+    assert not profiling.is_enabled()
+    with profiling.stage('dropped'):
+        pass
+    assert profiling.pop_events() == []
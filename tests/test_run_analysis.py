@@ -0,0 +1,75 @@
+import os
+import json
+import pytest
+import pandas as pd
+import run_analysis
+
+#---------------------------------------------------------------
+
+def write_manifest(path, phases):
+    with open(path, 'w') as f:
+        json.dump({'phases': phases}, f)
+    return path
+
+#---------------------------------------------------------------
+
+def test_descriptive_phases(synthetic_dataset, analysis_args, tmp_path, capsys):
+    manifest = write_manifest(str(tmp_path / 'phases.json'), [
+        {'name': 'val', 'submission': synthetic_dataset['submission1'], 'gt': synthetic_dataset['gt1']},
+        {'name': 'test', 'submission': synthetic_dataset['submission2'], 'gt': synthetic_dataset['gt2']}
+    ])
+
+    # Default names: the descriptive figures are skipped with a message
+    skipped = str(tmp_path / 'skipped')
+    os.makedirs(skipped)
+    run_analysis.main(analysis_args(manifest=manifest, output_path=skipped))
+    assert 'class.png and metric.png are skipped' in capsys.readouterr().out
+    assert not os.path.exists(os.path.join(skipped, 'class.png'))
+
+    drawn = str(tmp_path / 'drawn')
+    os.makedirs(drawn)
+    run_analysis.main(analysis_args(manifest=manifest, output_path=drawn, descriptive_phases=['val', 'test']))
+    assert os.path.exists(os.path.join(drawn, 'class.png'))
+    assert os.path.exists(os.path.join(drawn, 'metric.png'))
+
+#---------------------------------------------------------------
+
+def test_manifest_phases(synthetic_dataset, analysis_args, tmp_path):
+    # Reference: the two CLI phases
+    reference = str(tmp_path / 'reference')
+    os.makedirs(reference)
+    run_analysis.main(analysis_args(output_path=reference, no_plots=True))
+
+    output = str(tmp_path / 'manifest')
+    os.makedirs(output)
+    manifest = write_manifest(str(tmp_path / 'phases.json'), [
+        {'name': 'test', 'submission': synthetic_dataset['submission2'], 'gt': synthetic_dataset['gt2']},
+        {'name': 'val', 'submission': synthetic_dataset['submission1'], 'gt': synthetic_dataset['gt1']},
+        {'name': 'rerun', 'submission': synthetic_dataset['submission2'], 'gt': synthetic_dataset['gt2']}
+    ])
+    run_analysis.main(analysis_args(manifest=manifest, output_path=output, no_plots=True))
+
+    expected = {'test': '2', 'val': '1', 'rerun': '2'}
+    for name, phase in expected.items():
+        metrics = pd.read_csv(os.path.join(output, f'evaluation_metrics{name}.csv'))
+        pd.testing.assert_frame_equal(metrics, pd.read_csv(os.path.join(reference, f'evaluation_metrics{phase}.csv')))
+
+    summary = pd.read_csv(os.path.join(output, 'summary.csv'), dtype={'Phase': str})
+    assert list(summary['Phase'].unique()) == ['test', 'val', 'rerun']
+    for name in expected:
+        metrics = pd.read_csv(os.path.join(output, f'evaluation_metrics{name}.csv'))
+        rows = summary[summary['Phase'] == name].drop(columns='Phase').reset_index(drop=True)
+        pd.testing.assert_frame_equal(rows, metrics, check_dtype=False)
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('phases, message', [
+    ([], 'no phases'),
+    ([{'name': 'a', 'submission': 's.csv'}], 'phase 0 has no gt'),
+    ([{'name': 'a', 'submission': 's.csv', 'gt': 'g.csv'}, {'name': 'a', 'submission': 's.csv', 'gt': 'g.csv'}],
+     'duplicate phase names a')
+])
+def test_invalid_manifest(analysis_args, tmp_path, phases, message):
+    manifest = write_manifest(str(tmp_path / 'phases.json'), phases)
+    with pytest.raises(ValueError, match=message):
+        run_analysis.load_phases(analysis_args(manifest=manifest))
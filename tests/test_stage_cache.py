@@ -0,0 +1,106 @@
+import os
+import shutil
+import importlib.util
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from metrics import profiling
+import run_analysis
+
+# Each stage must rerun when one of its inputs, parameters or the source of a
+# module it calls changes, and only then
+
+#---------------------------------------------------------------
+
+@pytest.fixture
+def edit_source(monkeypatch, tmp_path):
+    # Makes source_digest see an edited copy of the given modules
+    find_spec = importlib.util.find_spec
+    edited = {}
+
+    def fake_find_spec(name, *args, **kwargs):
+        if name in edited:
+            return SimpleNamespace(origin=edited[name])
+        return find_spec(name, *args, **kwargs)
+    monkeypatch.setattr(importlib.util, 'find_spec', fake_find_spec)
+
+    def edit(module_name):
+        path = str(tmp_path / f'{module_name}.{len(edited)}.py')
+        shutil.copyfile(find_spec(module_name).origin, path)
+        with open(path, 'a') as f:
+            f.write('\n# edited\n')
+        edited[module_name] = path
+    return edit
+
+#---------------------------------------------------------------
+
+def cached_stages(run):
+    profiling.enable()
+    try:
+        run()
+        return {event['stage']: event['cached'] for event in profiling.pop_events() if 'cached' in event}
+    finally:
+        profiling.disable()
+
+#---------------------------------------------------------------
+
+def test_phase_stages(synthetic_dataset, tmp_path, edit_source):
+    gt_file = str(tmp_path / 'gt.csv')
+    shutil.copyfile(synthetic_dataset['gt1'], gt_file)
+    cache_dir = str(tmp_path / 'cache')
+
+    def run(**kwargs):
+        return cached_stages(lambda: run_analysis.load_analysis(
+            synthetic_dataset['tracks'], synthetic_dataset['submission1'], gt_file,
+            synthetic_dataset['timestamp_pattern'], output_file=str(tmp_path / 'metrics.csv'),
+            delong_file=str(tmp_path / 'delong.csv'), cache_dir=cache_dir, **kwargs))
+
+    stages = ['ingest', 'match', 'scores', 'metrics', 'delong']
+    assert run() == dict.fromkeys(stages, False)
+    assert run() == dict.fromkeys(stages, True)
+
+    # Parameter: max_skew only enters the match key and what depends on it
+    assert run(max_skew=10**9) == {'ingest': True, 'match': False, 'scores': False, 'metrics': False, 'delong': False}
+
+    # Input: a changed GT label
+    gt = pd.read_csv(gt_file, header=None)
+    gt.loc[0, 1] = 1 - gt.loc[0, 1]
+    gt.to_csv(gt_file, header=False, index=False)
+    assert run() == dict.fromkeys(stages, False)
+
+    # Code: each module reruns the stages that call it
+    edit_source('metrics.delong')
+    assert run() == {'ingest': True, 'match': True, 'scores': True, 'metrics': True, 'delong': False}
+    edit_source('metrics.overall_metrics')
+    assert run() == {'ingest': True, 'match': True, 'scores': True, 'metrics': False, 'delong': False}
+    edit_source('metrics.file_ids')
+    assert run() == dict.fromkeys(stages, False)
+
+#---------------------------------------------------------------
+
+def test_quality_and_strata_stages(synthetic_dataset, analysis_args, tmp_path, edit_source):
+    quality_csv = str(tmp_path / 'quality.csv')
+    shutil.copyfile(synthetic_dataset['quality_csv'], quality_csv)
+    args = analysis_args(quality_csv=quality_csv, cache_dir=str(tmp_path / 'cache'))
+
+    def run():
+        stages = cached_stages(lambda: run_analysis.main(args))
+        return {stage: stages[stage] for stage in ['quality', 'strata_ncell', 'strata_snr']}
+
+    assert run() == dict.fromkeys(['quality', 'strata_ncell', 'strata_snr'], False)
+    assert run() == dict.fromkeys(['quality', 'strata_ncell', 'strata_snr'], True)
+
+    edit_source('metrics.overall_metrics')
+    assert run() == {'quality': True, 'strata_ncell': False, 'strata_snr': False}
+    edit_source('metrics.strata')
+    assert run() == {'quality': True, 'strata_ncell': False, 'strata_snr': False}
+    edit_source('metrics.upload_files')
+    assert run()['quality'] is False
+    edit_source('metrics.file_ids')
+    assert run()['quality'] is False
+
+    # Input: a changed quality metric
+    quality = pd.read_csv(quality_csv, index_col=0)
+    quality.iloc[0, 0] += 1
+    quality.to_csv(quality_csv)
+    assert run() == dict.fromkeys(['quality', 'strata_ncell', 'strata_snr'], False)
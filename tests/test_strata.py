@@ -0,0 +1,83 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import roc_auc_score, precision_score, recall_score, balanced_accuracy_score
+from metrics.ncell_curves import compute_score_per_cell_count
+from metrics.snr_curves import compute_score_by_snr
+
+#---------------------------------------------------------------
+
+def stratum_score(subset, column):
+    predictions = (subset[column] >= 0.5).astype(int)
+    auci = roc_auc_score(subset['gt'], subset[column])
+    precision = precision_score(subset['gt'], predictions, zero_division=0)
+    recall = recall_score(subset['gt'], predictions)
+    balanced_acc = balanced_accuracy_score(subset['gt'], predictions)
+    return round(0.4 * auci + 0.2 * (precision + recall + balanced_acc), 3)
+
+def score_per_cell_count_loop(all_data, counts):
+    # Merge-and-loop versions that stratified_scores replaced
+    all_datac = all_data.merge(counts[['N.TRACKS']], left_on='file_id', right_index=True, how='left')
+    rows = []
+    for column in all_datac.columns:
+        if column not in ['gt', 'N.TRACKS', 'file_id']:
+            for num_cells in sorted(all_datac['N.TRACKS'].unique()):
+                subset = all_datac[all_datac['N.TRACKS'] == num_cells]
+                if len(subset) > 1 and 0 < num_cells <= 7:
+                    rows.append((num_cells, column, stratum_score(subset, column)))
+    return pd.DataFrame(rows, columns=['Num_Cells', 'Model', 'Score'])
+
+def score_by_snr_loop(all_data, metric, max_snr=30, bins=15):
+    all_datac = all_data.merge(metric[['SNR']], left_on='file_id', right_index=True, how='left')
+    rows = []
+    _, snr_bins = np.histogram(all_datac['SNR'][all_datac['SNR'] < max_snr], bins=bins)
+    for column in all_datac.columns:
+        if column not in ['gt', 'SNR', 'file_id']:
+            for i in range(1, len(snr_bins)):
+                subset = all_datac[(all_datac['SNR'] >= snr_bins[i - 1]) & (all_datac['SNR'] < snr_bins[i])]
+                subset = subset[subset['SNR'] < max_snr]
+                if len(subset) > 1 and len(np.unique(subset['gt'])) > 1:
+                    rows.append((snr_bins[i], column, stratum_score(subset, column)))
+    return pd.DataFrame(rows, columns=['SNR', 'Model', 'Score']), snr_bins
+
+#---------------------------------------------------------------
+
+def random_case(rng):
+    n_files = int(rng.integers(20, 150))
+    n_models = int(rng.integers(1, 6))
+    file_ids = pd.Index([f'{k:02d}_{i}.avi' for k, i in enumerate(rng.permutation(n_files))], name='file_id')
+    y = rng.integers(0, 2, n_files)
+    scores = np.round(rng.random((n_files, n_models)) * 0.6 + y[:, None] * rng.random(n_models) * 0.4,
+                      int(rng.integers(1, 3)))
+    all_data = pd.DataFrame(scores, index=file_ids, columns=[f'Team {k}' for k in range(n_models)])
+    all_data['gt'] = y
+    quality = pd.DataFrame({
+        'SNR': np.round(rng.random(n_files) * 40, 1),
+        'N.TRACKS': rng.integers(0, 9, n_files)
+    }, index=file_ids)
+    return all_data, quality
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('seed', range(2))
+def test_stratified_scores_match_loops(seed):
+    rng = np.random.default_rng(seed)
+    compared = 0
+    for _ in range(80):
+        all_data, quality = random_case(rng)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            try:
+                expected = score_per_cell_count_loop(all_data, quality)
+            except ValueError:
+                # The loop fails on single-class strata
+                expected = None
+            expected_snr, expected_bins = score_by_snr_loop(all_data, quality)
+        if expected is not None:
+            pd.testing.assert_frame_equal(compute_score_per_cell_count(all_data, quality), expected, check_dtype=False)
+            compared += 1
+        metrics_df, snr_bins = compute_score_by_snr(all_data, quality)
+        pd.testing.assert_frame_equal(metrics_df, expected_snr, check_dtype=False)
+        np.testing.assert_array_equal(snr_bins, expected_bins)
+    assert compared > 0
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from metrics.overall_metrics import evaluate_models
+from metrics.threshold_sweep import threshold_sweep, best_thresholds
+
+#---------------------------------------------------------------
+
+def test_model_without_matching_files():
+    # 'Team B' shares no file IDs with the GT, so all its scores are NaN
+    all_data = pd.DataFrame({
+        'Team A': [0.9, 0.2, 0.7, 0.4],
+        'Team B': [np.nan] * 4,
+        'gt': [1, 0, 1, 0]
+    })
+    assert np.isnan(evaluate_models(all_data).set_index('Model').loc['Team B', 'AUC'])
+
+    sweep = threshold_sweep(all_data)
+    assert set(sweep['Model']) == {'Team A'}
+    best = best_thresholds(all_data, sweep).set_index('Model')
+    assert best.loc['Team A', 'Best Score'] == 1.0
+    assert np.isnan(best.loc['Team B', 'Best Threshold'])
+    assert np.isnan(best.loc['Team B', 'Best Score'])
+
+    no_rows = threshold_sweep(all_data[['Team B', 'gt']])
+    assert len(no_rows) == 0 and 'Threshold' in no_rows.columns
+    assert np.isnan(best_thresholds(all_data[['Team B', 'gt']], no_rows)['Best Score']).all()
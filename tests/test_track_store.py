@@ -0,0 +1,37 @@
+import os
+import numpy as np
+import pandas as pd
+from metrics.track_store import load_tracks, file_spots, track_counts
+
+#---------------------------------------------------------------
+
+def write_tracks(path, rng, n_tracks, n_frames):
+    rows = [(k, rng.random() * 100, rng.random() * 100, t) for k in range(n_tracks) for t in range(n_frames)]
+    pd.DataFrame(rows, columns=['id', 'x', 'y', 't']).to_csv(path, index=False)
+
+#---------------------------------------------------------------
+
+def test_store_round_trip_and_rebuild(tmp_path):
+    rng = np.random.default_rng(0)
+    track_dir, store_dir = str(tmp_path / 'tracks'), str(tmp_path / 'store')
+    os.makedirs(os.path.join(track_dir, 'sub'))
+    stems = {'01_1': (3, 5), '01_2': (1, 7), os.path.join('sub', '02_1'): (4, 2)}
+    for stem, (n_tracks, n_frames) in stems.items():
+        write_tracks(os.path.join(track_dir, stem + '.csv'), rng, n_tracks, n_frames)
+
+    def check(store):
+        for stem, (n_tracks, _) in stems.items():
+            expected = pd.read_csv(os.path.join(track_dir, stem + '.csv')).to_numpy()
+            assert np.array_equal(file_spots(store, os.path.basename(stem)), expected)
+        counts = dict(zip([meta['stem'] for meta in store['files']], track_counts(store)))
+        assert counts == {os.path.basename(stem): n_tracks for stem, (n_tracks, _) in stems.items()}
+
+    check(load_tracks(track_dir, store_dir))
+    check(load_tracks(track_dir))
+
+    # A changed CSV makes the store stale; the next load rebuilds it
+    stems['01_2'] = (2, 9)
+    write_tracks(os.path.join(track_dir, '01_2.csv'), rng, 2, 9)
+    store = load_tracks(track_dir, store_dir)
+    check(store)
+    assert store['files'][1]['size'] == os.path.getsize(os.path.join(track_dir, '01_2.csv'))
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+from metrics.upload_files import build_timestamp_index, get_nearest_file, preprocess_submission
+
+#---------------------------------------------------------------
+
+def test_get_nearest_file_accepts_dict_and_index():
+    rng = np.random.default_rng(0)
+    stamps = np.unique(rng.integers(0, 10**6, 50))
+    file_timestamp_dict = {int(ts): f'predicted{ts}.csv' for ts in stamps}
+    timestamp_index = build_timestamp_index(file_timestamp_dict)
+    for timestamp in rng.integers(-1000, 10**6 + 1000, 200).tolist() + stamps[:5].tolist():
+        # Nearest key, the earlier one on ties
+        expected = file_timestamp_dict[min(file_timestamp_dict, key=lambda x: abs(x - timestamp))]
+        assert get_nearest_file(timestamp, file_timestamp_dict) == expected
+        assert get_nearest_file(timestamp, timestamp_index) == expected
+    assert get_nearest_file(150, {100: 'a.csv', 200: 'b.csv'}) == 'a.csv'
+
+#---------------------------------------------------------------
+
+def preprocess_submission_whole(file_path):
+    # preprocess_submission before it read the log in chunks
+    df = pd.read_csv(file_path)
+    df = df[df['score'] != 0]
+    df = df.drop_duplicates(subset=df.columns[df.columns.isin(['id_submission', 'ts']) == False])
+    df['ts'] = pd.to_datetime(df['ts']) - pd.Timedelta(hours=1)
+    df = df[df['ts'].dt.year != 2025]
+    df['timestamp'] = df['ts'].astype(int) // 10**9
+    df = df.sort_values("score", ascending=False)
+    return df
+
+#---------------------------------------------------------------
+
+@pytest.mark.parametrize('chunk_rows', [7, 64, 1000])
+def test_preprocess_submission_chunks_match_whole_log(tmp_path, chunk_rows):
+    # A sparse text column is all missing in most chunks, and a team column
+    # that only holds numbers in some of them
+    rng = np.random.default_rng(0)
+    n = 400
+    log = pd.DataFrame({
+        'id_submission': np.arange(n),
+        'team': rng.choice(['1', '2', 'team 3'], n),
+        'score': rng.choice([0, 0.25, 0.5, 0.75], n),
+        'ts': pd.Timestamp('2024-11-06') + pd.to_timedelta(rng.integers(0, 4, n), unit='h'),
+        'auc': rng.choice([0.5, 0.6], n),
+        'note': np.where(rng.random(n) < 0.03, rng.choice(['rerun', 'fixed'], n), None)
+    })
+    log_path = str(tmp_path / 'leaderboard.csv')
+    log.to_csv(log_path, index=False)
+    expected = preprocess_submission_whole(log_path)
+    assert_frame_equal(preprocess_submission(log_path, chunk_rows=chunk_rows), expected)